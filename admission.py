@@ -0,0 +1,109 @@
+"""
+Token-bucket admission control for published commands.
+
+Every user and every device topic has a bucket that refills at rate tokens per
+second up to burst tokens; a command takes one token from the user's bucket and
+from the bucket of every device it goes to. Without a token the command is shed
+at once, so the handler can answer with a cheap close() instead of publishing.
+With max_wait set, a command that would get its tokens within max_wait seconds
+reserves them and waits instead (queue-with-deadline), which smooths short
+bursts without letting the queue grow unbounded.
+
+The buckets live in one process's memory. Each Lambda container has its own,
+so with N containers running at once the effective limit is up to N times the
+configured one; the gateway, being one process, enforces it exactly.
+
+Idle buckets are full again after burst / rate seconds, so they are kept in a
+TTLCache that forgets them after that and stays bounded.
+"""
+
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+ADMITTED = 'admitted'
+QUEUED = 'queued'
+SHED = 'shed'
+
+
+class TokenBucket(object):
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = now
+
+    def wait_time(self, now):
+        """
+        Seconds until a token is available (0 if one is now). Tokens go negative
+        while reservations are outstanding.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class AdmissionController(object):
+    def __init__(self, user_rate=0.0, user_burst=5, device_rate=0.0, device_burst=5, max_wait=0.0,
+                 maxsize=4096, clock=time.time, sleep=time.sleep):
+        """
+        A rate of 0 leaves that kind of key unlimited.
+        """
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.max_wait = max_wait
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self._clock = clock
+        self._sleep = sleep
+        refill = max([burst / float(rate) for rate, burst in ((user_rate, user_burst), (device_rate, device_burst)) if rate] or [0])
+        self._buckets = TTLCache(maxsize=maxsize, ttl=refill + 1, clock=clock)
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, rate, burst, now):
+        bucket = self._buckets.get(key, None)
+        if bucket is None:
+            bucket = TokenBucket(rate, burst, now)
+        # Set on every use so an active bucket never expires.
+        self._buckets.set(key, bucket)
+        return bucket
+
+    def admit(self, user_id, topics):
+        """
+        ADMITTED, QUEUED (after waiting for the tokens) or SHED for a command from
+        user_id to topics. A shed command takes no tokens.
+        """
+        now = self._clock()
+        with self._lock:
+            buckets = []
+            if self.user_rate:
+                buckets.append(self._bucket(('user', user_id), self.user_rate, self.user_burst, now))
+            if self.device_rate:
+                for topic in topics:
+                    buckets.append(self._bucket(('device', topic), self.device_rate, self.device_burst, now))
+            wait = max([bucket.wait_time(now) for bucket in buckets] or [0.0])
+            if wait > self.max_wait:
+                self.shed += 1
+                return SHED
+            for bucket in buckets:
+                bucket.take()
+            if not wait:
+                self.admitted += 1
+                return ADMITTED
+            self.queued += 1
+        self._sleep(wait)
+        return QUEUED
+
+    def stats(self):
+        return {'admitted': self.admitted, 'queued': self.queued, 'shed': self.shed}
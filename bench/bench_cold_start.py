@@ -0,0 +1,95 @@
+"""
+Cold-start benchmark for my_lex-lambda.py.
+
+Every sample runs in a fresh interpreter and records how long the handler module
+takes to import and how long its first invocation takes, per intent and
+invocation source. The iot-data client is really constructed (that is part of the
+cold start) but its publish call is replaced by a no-op, and Watch lookups go to
+a local stub server.
+
+    python bench/bench_cold_start.py [--runs 10] [--python /path/to/python]
+
+boto3 must be installed for the interpreter being measured.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+CASES = [
+    (intent, source)
+    for intent in ('Remote', 'Turn', 'Watch')
+    for source in ('DialogCodeHook', 'FulfillmentCodeHook')
+]
+
+
+def child(intent, source):
+    import logging
+    logging.getLogger().addHandler(logging.NullHandler())
+    from stub_lookup_server import start_stub_server
+    server, url = start_stub_server()
+    os.environ['SHOW_LOOKUP_URL'] = url
+
+    start = time.time()
+    from lambda_modules import load_handler_module
+    module = load_handler_module('my_lex_lambda')
+    import_ms = (time.time() - start) * 1000.0
+
+    real_get_iot_client = module.get_iot_client
+
+    def get_iot_client():
+        client = real_get_iot_client()
+        client.publish = lambda **kwargs: {}
+        return client
+    module.get_iot_client = get_iot_client
+
+    from events import make_event
+    event = make_event(intent, source=source)
+    start = time.time()
+    module.lambda_handler(event, None)
+    first_ms = (time.time() - start) * 1000.0
+    if 'lookup' in module._clients:
+        module.get_lookup_http().close()
+    server.shutdown()
+    print(json.dumps({'import_ms': import_ms, 'first_ms': first_ms}))
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--python', default=sys.executable)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    env = dict(os.environ, AWS_DEFAULT_REGION='us-east-1')
+    print('{:<8} {:<20} {:>12} {:>16}'.format('intent', 'source', 'import ms', 'first call ms'))
+    for intent, source in CASES:
+        samples = []
+        for _ in range(args.runs):
+            output = subprocess.check_output(
+                [args.python, os.path.abspath(__file__), '--child', intent, source],
+                env=env
+            )
+            samples.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+        print('{:<8} {:<20} {:>12.1f} {:>16.1f}'.format(
+            intent,
+            source,
+            median([s['import_ms'] for s in samples]),
+            median([s['first_ms'] for s in samples])
+        ))
+
+
+if __name__ == '__main__':
+    main()
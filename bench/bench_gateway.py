@@ -0,0 +1,124 @@
+"""
+Throughput benchmark for gateway.py on a single box (Python 3.7+).
+
+Starts the gateway in a subprocess with IOT_CLIENT=local, so publishes are only
+recorded, then sends fulfilled Remote and Turn events over --connections
+keep-alive connections at once and reports requests per second and latency
+percentiles.
+
+    python bench/bench_gateway.py [--requests 5000] [--connections 32] [--workers 16]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from events import make_event
+from lambda_modules import REPO_ROOT
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def wait_until_listening(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return
+        except socket.error:
+            time.sleep(0.05)
+    raise RuntimeError('Gateway did not start on port {}'.format(port))
+
+
+async def post(reader, writer, body):
+    writer.write(
+        'POST / HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(
+            len(body)).encode('latin-1') + body)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b'\r\n':
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(port, bodies, samples, failures):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for body in bodies:
+        start = time.time()
+        status, response = await post(reader, writer, body)
+        samples.append(time.time() - start)
+        if status != 200 or response['dialogAction'].get('fulfillmentState') != 'Fulfilled':
+            failures.append((status, response))
+    writer.close()
+
+
+async def run(port, bodies, connections):
+    samples = []
+    failures = []
+    started = time.time()
+    await asyncio.gather(*[
+        client(port, bodies[i::connections], samples, failures) for i in range(connections)
+    ])
+    return time.time() - started, sorted(samples), failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    port = free_port()
+    env = dict(os.environ, LOG_LEVEL='WARNING', COALESCE_WINDOW_MS='0')
+    gateway = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, 'gateway.py'), '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(args.workers), '--iot', 'local'],
+        env=env,
+        # The per-invocation metrics records would swamp the report.
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_listening(port)
+        bodies = []
+        for i in range(args.requests):
+            if i % 2:
+                event = make_event('Turn', {'ChannelNumber': str(i % 100)}, user_id='user-{}'.format(i % 50))
+            else:
+                event = make_event('Remote', {'Action': 'next'}, user_id='user-{}'.format(i % 50))
+            bodies.append(json.dumps(event).encode('utf-8'))
+        elapsed, samples, failures = asyncio.run(run(port, bodies, args.connections))
+    finally:
+        gateway.terminate()
+        gateway.wait()
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))] * 1000.0
+
+    print('{} requests over {} connections in {:.2f}s: {:.0f} req/s'.format(
+        len(samples), args.connections, elapsed, len(samples) / elapsed))
+    print('latency ms  p50 {:.2f}  p95 {:.2f}  p99 {:.2f}'.format(pct(50), pct(95), pct(99)))
+    for failure in failures[:5]:
+        print('FAILED {!r}'.format(failure))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Replay benchmark for lambda_handler in lex-lambda.py and my_lex-lambda.py.
+
+Replays a corpus of Lex V1 events through both handler modules and reports, per
+module / intent / invocation source, throughput, p50/p95/p99 latency and the
+peak bytes allocated per event (tracemalloc, Python 3 only). Commands go to the
+in-process recorder from local_iot (IOT_CLIENT=local) and Watch lookups go to a
+local stub server, so nothing leaves the machine.
+
+    python bench/bench_handler.py [--iterations 2000] [--corpus events.jsonl]
+                                  [--save results.json] [--baseline results.json]
+
+--corpus replays recorded events (one JSON event per line, routed by bot name:
+'BookTrip' goes to lex-lambda.py, anything else to my_lex-lambda.py) instead of
+the synthetic corpus. With --baseline the run fails (exit status 1) when the p95
+of any case is more than --tolerance slower than in the saved baseline, so the
+suite can gate CI.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from events import make_event
+from lambda_modules import load_handler_module
+from stub_lookup_server import start_stub_server
+
+SYNTHETIC_CORPUS = [
+    ('my_lex_lambda', 'Remote', [{'Action': 'louder'}, {'Action': 'next'}, {'Action': 'volume'}]),
+    ('my_lex_lambda', 'Turn', [{'ChannelNumber': '42'}, {'ChannelNumber': '7'}, {'ChannelNumber': 'five'}]),
+    ('my_lex_lambda', 'Watch', [{'Show': 'news'}, {'Show': 'Movies'}, {'Show': 'unknown show'}]),
+    ('lex_lambda', 'BookHotel', [{'Action': 'next'}, {'Action': 'back'}, {'Action': 'paris'}]),
+    ('lex_lambda', 'Remote', [{'Action': 'next'}, {'Action': 'louder'}]),
+]
+SOURCES = ('DialogCodeHook', 'FulfillmentCodeHook')
+
+
+def synthetic_corpus():
+    for module, intent, slot_sets in SYNTHETIC_CORPUS:
+        for source in SOURCES:
+            events = [make_event(intent, slots, source) for slots in slot_sets]
+            yield (module, intent, source), events
+
+
+def recorded_corpus(path):
+    cases = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            module = 'lex_lambda' if event['bot']['name'] == 'BookTrip' else 'my_lex_lambda'
+            key = (module, event['currentIntent']['name'], event['invocationSource'])
+            cases.setdefault(key, []).append(event)
+    return sorted(cases.items())
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def peak_bytes(handler, event):
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    tracemalloc.start()
+    handler(json.loads(event), None)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run_case(handler, events, iterations):
+    # Handlers mutate their event, so every call gets a fresh copy decoded up front.
+    encoded = [json.dumps(event) for event in events]
+    batch = [json.loads(encoded[i % len(encoded)]) for i in range(iterations)]
+    samples = []
+    started = time.time()
+    for event in batch:
+        start = time.time()
+        handler(event, None)
+        samples.append(time.time() - start)
+    elapsed = time.time() - started
+    samples.sort()
+    return {
+        'calls': iterations,
+        'throughput': iterations / elapsed,
+        'p50_us': percentile(samples, 50) * 1e6,
+        'p95_us': percentile(samples, 95) * 1e6,
+        'p99_us': percentile(samples, 99) * 1e6,
+        'peak_bytes': peak_bytes(handler, encoded[0]),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in sorted(results.items()):
+        before = baseline.get(name)
+        if before and result['p95_us'] > before['p95_us'] * (1 + tolerance):
+            regressions.append('{}: p95 {:.1f}us -> {:.1f}us'.format(name, before['p95_us'], result['p95_us']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--corpus', help='JSON lines file of recorded events')
+    parser.add_argument('--save', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='fail if p95 regressed against this results file')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.getLogger().addHandler(logging.NullHandler())
+    server, url = start_stub_server()
+    os.environ['SHOW_LOOKUP_URL'] = url
+    os.environ['IOT_CLIENT'] = 'local'
+
+    modules = {}
+    for name in ('lex_lambda', 'my_lex_lambda'):
+        modules[name] = load_handler_module(name)
+    iot = modules['my_lex_lambda'].get_iot_client()
+
+    corpus = recorded_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    results = {}
+    print('{:<44} {:>10} {:>10} {:>10} {:>10} {:>12}'.format('case', 'calls/s', 'p50 us', 'p95 us', 'p99 us', 'peak bytes'))
+    for (module, intent, source), events in corpus:
+        name = '{}/{}/{}'.format(module, intent, source)
+        result = results[name] = run_case(modules[module].lambda_handler, events, args.iterations)
+        print('{:<44} {:>10.0f} {:>10.1f} {:>10.1f} {:>10.1f} {:>12}'.format(
+            name,
+            result['throughput'],
+            result['p50_us'],
+            result['p95_us'],
+            result['p99_us'],
+            'n/a' if result['peak_bytes'] is None else result['peak_bytes']
+        ))
+    print('{} publishes recorded'.format(len(iot.messages)))
+    if 'lookup' in modules['my_lex_lambda']._clients:
+        modules['my_lex_lambda'].get_lookup_http().close()
+    server.shutdown()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print('REGRESSION ' + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
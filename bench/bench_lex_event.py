@@ -0,0 +1,73 @@
+"""
+Microbenchmark of reading a Lex event through try_ex lambdas, the way the
+handlers used to, against the LexEvent view.
+
+    python bench/bench_lex_event.py [--number 200000]
+
+Both variants perform the reads a Remote DialogCodeHook turn needs. Allocation
+figures need tracemalloc (Python 3) and are the peak bytes allocated while
+handling one event.
+"""
+
+import argparse
+import timeit
+
+import lambda_modules  # noqa: F401  (puts the repo root on sys.path)
+from events import make_event
+from lex_event import LexEvent
+
+
+def try_ex(func):
+    try:
+        return func()
+    except KeyError:
+        return None
+
+
+def with_try_ex(intent_request):
+    action = try_ex(lambda: intent_request['currentIntent']['slots']['Action'])
+    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    if intent_request['invocationSource'] == 'DialogCodeHook':
+        slots = intent_request['currentIntent']['slots']
+        validated = try_ex(lambda: slots['Action'])
+        return action, validated, session_attributes, intent_request['currentIntent']['name'], intent_request['userId']
+
+
+def with_view(intent_request):
+    event = LexEvent(intent_request)
+    action = event.slot('Action')
+    if event.is_dialog_hook:
+        return action, event.slots.get('Action'), event.session_attributes, event.intent_name, event.user_id
+
+
+def peak_bytes(func, event):
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    func(event)
+    tracemalloc.start()
+    func(event)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=200000)
+    args = parser.parse_args()
+
+    event = make_event('Remote', source='DialogCodeHook')
+    for label, func in (('try_ex lambdas', with_try_ex), ('LexEvent view', with_view)):
+        seconds = min(timeit.repeat(lambda: func(event), number=args.number, repeat=5))
+        peak = peak_bytes(func, event)
+        print('{:<16} {:.3f} us/event  peak {} bytes/event'.format(
+            label,
+            seconds / args.number * 1e6,
+            'n/a' if peak is None else peak
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare per-call latency of the show lookup with a new connection per call
+(what watch() used to do with urllib2.urlopen) against the pooled HTTPClient.
+
+    python bench/bench_lookup_client.py [--calls 500] [--delay 0.0]
+
+The stub server is plain HTTP on localhost, so the saving shown is the TCP
+handshake only; against the real HTTPS endpoint the TLS handshake is saved too.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    from urllib2 import Request, urlopen
+except ImportError:
+    from urllib.request import Request, urlopen
+
+from http_client import HTTPClient
+from stub_lookup_server import start_stub_server
+
+
+def per_call_connection(url, show):
+    req = Request(url)
+    req.add_header('Content-Type', 'application/json')
+    response = urlopen(req, json.dumps({'q': show}).encode('utf-8'))
+    return json.loads(response.read().decode('utf-8'))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def run(label, func, calls):
+    samples = []
+    for i in range(calls):
+        start = time.time()
+        func()
+        samples.append((time.time() - start) * 1000.0)
+    print('{:<22} mean={:.3f}ms p50={:.3f}ms p95={:.3f}ms p99={:.3f}ms'.format(
+        label,
+        sum(samples) / len(samples),
+        percentile(samples, 50),
+        percentile(samples, 95),
+        percentile(samples, 99)
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--delay', type=float, default=0.0, help='server-side delay per request in seconds')
+    args = parser.parse_args()
+
+    server, url = start_stub_server(delay=args.delay)
+    client = HTTPClient()
+    try:
+        run('new connection/call', lambda: per_call_connection(url, 'news'), args.calls)
+        run('pooled keep-alive', lambda: client.post_json(url, {'q': 'news'}), args.calls)
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
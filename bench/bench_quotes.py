@@ -0,0 +1,104 @@
+"""
+Check that QuoteEngine prices are bit-identical to the scalar pricing functions,
+then time a batch of quotes both ways.
+
+    python bench/bench_quotes.py [--quotes 100000]
+
+The scalar functions are checked against a copy of their original
+character-by-character implementation as well. Needs NumPy.
+"""
+
+import argparse
+import random
+import struct
+import time
+
+from lambda_modules import load_handler_module
+from quote_engine import CAR_TYPES, ROOM_TYPES, QuoteEngine
+
+LOCATIONS = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Philadelphia', 'Phoenix', 'San Antonio',
+             'San Diego', 'Dallas', 'San Jose', 'Austin', 'Jacksonville', 'San Francisco', 'Indianapolis',
+             'Columbus', 'Fort Worth', 'Charlotte', 'Detroit', 'El Paso', 'Seattle', 'Denver', 'Taipei']
+
+
+def original_car_price(location, days, age, car_type):
+    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
+    base_location_cost = 0
+    for i in range(len(location)):
+        base_location_cost += ord(location.lower()[i]) - 97
+
+    age_multiplier = 1.10 if age < 25 else 1
+    if car_type not in car_types:
+        car_type = car_types[0]
+
+    return days * ((100 + base_location_cost) + ((car_types.index(car_type.lower()) * 50) * age_multiplier))
+
+
+def original_hotel_price(location, nights, room_type):
+    room_types = ['queen', 'king', 'deluxe']
+    cost_of_living = 0
+    for i in range(len(location)):
+        cost_of_living += ord(location.lower()[i]) - 97
+
+    return nights * (100 + cost_of_living + (100 + room_types.index(room_type.lower())))
+
+
+def same_bits(a, b):
+    return struct.pack('<d', float(a)) == struct.pack('<d', float(b))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quotes', type=int, default=100000)
+    args = parser.parse_args()
+
+    module = load_handler_module('lex_lambda')
+    rng = random.Random(7)
+    n = args.quotes
+    locations = [rng.choice(LOCATIONS) for _ in range(n)]
+    days = [rng.randint(1, 30) for _ in range(n)]
+    ages = [rng.randint(18, 80) for _ in range(n)]
+    car_types = [rng.choice(CAR_TYPES + ('Luxury', 'spaceship')) for _ in range(n)]
+    room_types = [rng.choice(ROOM_TYPES + ('King',)) for _ in range(n)]
+
+    start = time.time()
+    original = [original_car_price(*q) for q in zip(locations, days, ages, car_types)]
+    original_s = time.time() - start
+    start = time.time()
+    scalar = [module.generate_car_price(*q) for q in zip(locations, days, ages, car_types)]
+    scalar_s = time.time() - start
+    engine = QuoteEngine(LOCATIONS)
+    start = time.time()
+    batch = engine.car_prices(locations, days, ages, car_types)
+    batch_s = time.time() - start
+    mismatches = sum(1 for a, b, c in zip(original, scalar, batch) if not (same_bits(a, b) and same_bits(a, c)))
+    print('car:   original {:.3f}s  scalar {:.3f}s  batch {:.3f}s  mismatches {}'.format(original_s, scalar_s, batch_s, mismatches))
+
+    start = time.time()
+    original = [original_hotel_price(*q) for q in zip(locations, days, room_types)]
+    original_s = time.time() - start
+    start = time.time()
+    scalar = [module.generate_hotel_price(*q) for q in zip(locations, days, room_types)]
+    scalar_s = time.time() - start
+    start = time.time()
+    batch = engine.hotel_prices(locations, days, room_types)
+    batch_s = time.time() - start
+    hotel_mismatches = sum(1 for a, b, c in zip(original, scalar, batch) if not (a == b == c))
+    print('hotel: original {:.3f}s  scalar {:.3f}s  batch {:.3f}s  mismatches {}'.format(original_s, scalar_s, batch_s, hotel_mismatches))
+
+    grid = engine.car_price_grid(LOCATIONS, range(1, 31), CAR_TYPES, 21)
+    grid_mismatches = sum(
+        1
+        for i, location in enumerate(LOCATIONS)
+        for j, d in enumerate(range(1, 31))
+        for k, car_type in enumerate(CAR_TYPES)
+        if not same_bits(grid[i, j, k], original_car_price(location, d, 21, car_type))
+    )
+    print('car grid {}: mismatches {}'.format(grid.shape, grid_mismatches))
+
+    if mismatches or hotel_mismatches or grid_mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Microbenchmark of the PiInput command encodings in wire_format.py.
+
+    python bench/bench_wire_format.py [--number 100000]
+
+For each sample command and content type, reports the payload size and the
+encode and decode cost, and checks that decoding gives the command back.
+"""
+
+import argparse
+import sys
+import timeit
+
+import lambda_modules  # noqa: F401  (puts the repo root on sys.path)
+import wire_format
+
+SAMPLES = [
+    ('Remote', {'Method': 'Remote', 'Action': 'louder'}),
+    ('Remote+Repeat', {'Method': 'Remote', 'Action': 'next', 'Repeat': 3}),
+    ('Turn', {'Method': 'Turn', 'ChannelNumber': '42'}),
+    ('Turn+Sent', {'Method': 'Turn', 'ChannelNumber': '42', 'Sent': 1700000000.123}),
+]
+CONTENT_TYPES = (
+    ('json', wire_format.CONTENT_TYPE_JSON),
+    ('binary', wire_format.CONTENT_TYPE_BINARY),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    mismatches = 0
+    print('{:<16} {:<8} {:>6} {:>12} {:>12}'.format('command', 'format', 'bytes', 'encode us', 'decode us'))
+    for name, message in SAMPLES:
+        for label, content_type in CONTENT_TYPES:
+            payload = wire_format.encode(message, content_type)
+            if wire_format.decode(payload) != message:
+                mismatches += 1
+                print('MISMATCH {} {}'.format(name, label))
+            encode = min(timeit.repeat(
+                lambda: wire_format.encode(message, content_type), number=args.number, repeat=3))
+            decode = min(timeit.repeat(
+                lambda: wire_format.decode(payload), number=args.number, repeat=3))
+            print('{:<16} {:<8} {:>6} {:>12.3f} {:>12.3f}'.format(
+                name,
+                label,
+                len(payload),
+                encode / args.number * 1e6,
+                decode / args.number * 1e6
+            ))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
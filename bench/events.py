@@ -0,0 +1,35 @@
+"""
+Synthetic Lex V1 events for the benchmarks.
+"""
+
+import json
+
+SAMPLE_SLOTS = {
+    'Remote': {'Action': 'louder'},
+    'Turn': {'ChannelNumber': '42'},
+    'Watch': {'Show': 'news'},
+    'BookHotel': {'Action': 'next'},
+    'Status': {},
+}
+
+
+def make_event(intent, slots=None, source='FulfillmentCodeHook', user_id='bench-user', session_attributes=None):
+    """
+    Build an event the way Lambda delivers it, i.e. decoded from JSON (unicode strings on Python 2).
+    """
+    event = {
+        'messageVersion': '1.0',
+        'invocationSource': source,
+        'userId': user_id,
+        'sessionAttributes': session_attributes,
+        'bot': {'name': 'TVRemote', 'alias': '$LATEST', 'version': '$LATEST'},
+        'outputDialogMode': 'Text',
+        'currentIntent': {
+            'name': intent,
+            'slots': dict(SAMPLE_SLOTS[intent] if slots is None else slots),
+            'confirmationStatus': 'None'
+        },
+        # Unicode so that non-ASCII slot values work on Python 2 as well.
+        'inputTranscript': u' '.join(u'{}'.format(v) for v in (slots or SAMPLE_SLOTS[intent]).values())
+    }
+    return json.loads(json.dumps(event))
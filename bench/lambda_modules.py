@@ -0,0 +1,29 @@
+"""
+Load the Lambda handler files, whose names are not importable module names.
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+HANDLER_FILES = {
+    'lex_lambda': 'lex-lambda.py',
+    'my_lex_lambda': 'my_lex-lambda.py',
+}
+
+
+def load_handler_module(name):
+    path = os.path.join(REPO_ROOT, HANDLER_FILES[name])
+    try:
+        import importlib.util
+    except ImportError:
+        import imp
+        return imp.load_source(name, path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,167 @@
+"""
+End-to-end throughput test for the publish path of my_lex-lambda.py.
+
+Drives thousands of fulfilled Remote and Turn events through lambda_handler
+with IOT_CLIENT set, so commands go to a local_iot client instead of AWS IoT,
+reports the sustained publishes per second and checks that every command
+arrived exactly once.
+
+    python bench/load_test.py [--events 5000] [--threads 1] [--users 20]
+                              [--latency 0.0] [--async-publish]
+                              [--content-type application/x-piinput]
+                              [--mqtt mqtt://localhost:1883]
+
+By default the in-process LocalIotDataClient records the publishes; --latency
+adds a simulated IoT round trip to each of them. With --mqtt the commands are
+published to that broker and a paho-mqtt subscriber checks what it received.
+Coalescing is switched off, since it merges repeated commands on purpose.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
+
+from events import make_event
+from lambda_modules import load_handler_module
+import wire_format
+
+ACTIONS = ('back', 'next', 'louder', 'smaller', 'power')
+CHANNELS = ('1', '7', '13', '42', '101')
+
+
+def build_events(count, users):
+    """
+    Returns the events and the (topic, payload) each of them must publish.
+    """
+    events = []
+    expected = []
+    for i in range(count):
+        user_id = 'load-user-{}'.format(i % users)
+        if i % 2:
+            channel = CHANNELS[i % len(CHANNELS)]
+            events.append(make_event('Turn', {'ChannelNumber': channel}, user_id=user_id))
+            expected.append(('PiInput', {'Method': 'Turn', 'ChannelNumber': channel}))
+        else:
+            action = ACTIONS[i % len(ACTIONS)]
+            events.append(make_event('Remote', {'Action': action}, user_id=user_id))
+            expected.append(('PiInput', {'Method': 'Remote', 'Action': action}))
+    return events, expected
+
+
+def canonical(messages):
+    return sorted((topic, json.dumps(payload, sort_keys=True)) for topic, payload in messages)
+
+
+class MqttRecorder(object):
+    def __init__(self, host, port, topic='PiInput'):
+        import paho.mqtt.client as mqtt
+        try:
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        except AttributeError:
+            self.client = mqtt.Client()
+        self.messages = []
+        self._subscribed = threading.Event()
+        self.client.on_message = self._on_message
+        self.client.on_subscribe = lambda *args: self._subscribed.set()
+        self.client.connect(host, port)
+        self.client.subscribe(topic, qos=1)
+        self.client.loop_start()
+        self._subscribed.wait(5)
+
+    def _on_message(self, client, userdata, message):
+        self.messages.append((message.topic, wire_format.decode(message.payload)))
+
+    def wait_for(self, count, timeout):
+        deadline = time.time() + timeout
+        while len(self.messages) < count and time.time() < deadline:
+            time.sleep(0.01)
+        return list(self.messages)
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+def drive(handler, events, threads):
+    failures = []
+
+    def worker(batch):
+        for event in batch:
+            try:
+                response = handler(event, None)
+                if response['dialogAction'].get('fulfillmentState') != 'Fulfilled':
+                    failures.append(response)
+            except Exception as e:
+                failures.append(e)
+
+    workers = [threading.Thread(target=worker, args=(events[i::threads],)) for i in range(threads)]
+    started = time.time()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.time() - started, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated seconds per publish')
+    parser.add_argument('--async-publish', action='store_true', help='set ASYNC_PUBLISH=1')
+    parser.add_argument('--content-type', default=wire_format.CONTENT_TYPE_JSON, help='PAYLOAD_CONTENT_TYPE')
+    parser.add_argument('--mqtt', help='publish to this broker, e.g. mqtt://localhost:1883')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds to wait for MQTT deliveries')
+    args = parser.parse_args()
+
+    logging.getLogger().addHandler(logging.NullHandler())
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    os.environ['COALESCE_WINDOW_MS'] = '0'
+    os.environ['IOT_CLIENT'] = args.mqtt or 'local'
+    os.environ['PAYLOAD_CONTENT_TYPE'] = args.content_type
+    if args.async_publish:
+        os.environ['ASYNC_PUBLISH'] = '1'
+
+    recorder = None
+    if args.mqtt:
+        parts = urlsplit(args.mqtt)
+        recorder = MqttRecorder(parts.hostname or 'localhost', parts.port or 1883)
+
+    module = load_handler_module('my_lex_lambda')
+    iot = module.get_iot_client()
+    if recorder is None:
+        iot.latency = args.latency
+
+    events, expected = build_events(args.events, args.users)
+    elapsed, failures = drive(module.lambda_handler, events, args.threads)
+
+    if recorder is not None:
+        received = recorder.wait_for(len(expected), args.timeout)
+        recorder.close()
+        iot.close()
+    else:
+        received = [(message.topic, wire_format.decode(message.payload)) for message in iot.messages]
+
+    print('{} events in {:.2f}s on {} thread(s): {:.0f} publishes/s'.format(
+        len(events), elapsed, args.threads, len(received) / elapsed))
+    ok = canonical(received) == canonical(expected)
+    print('{} of {} commands arrived{}'.format(
+        len(received), len(expected), '' if ok else ', MISMATCH'))
+    for failure in failures[:5]:
+        print('FAILED {!r}'.format(failure))
+    if failures or not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Local stand-in for the show lookup API used by watch().
+
+Replies in the same shape as the real endpoint: {"body-json": {"errorMessage": <channel>}}.
+Supports HTTP/1.1 keep-alive so connection reuse can be measured.
+"""
+
+import json
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+
+DEFAULT_CHANNELS = {
+    'news': '42',
+    'cartoons': '7',
+    'movies': '13',
+}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _make_handler(channels, delay):
+    class LookupHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            query = json.loads(self.rfile.read(length).decode('utf-8'))['q']
+            if delay:
+                time.sleep(delay)
+            channel = channels.get(' '.join(query.lower().split()), 'not found')
+            body = json.dumps({'body-json': {'errorMessage': channel}}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return LookupHandler
+
+
+def start_stub_server(channels=None, delay=0.0):
+    """
+    Start the stub on an ephemeral localhost port in a daemon thread.
+    Returns (server, url); call server.shutdown() when done.
+    """
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(channels or DEFAULT_CHANNELS, delay))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:{}/lookup'.format(server.server_address[1])
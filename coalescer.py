@@ -0,0 +1,114 @@
+"""
+Merges bursts of the same Remote action into a single MQTT message.
+
+The first action for a key (user and device) is sent straight away and opens a
+window. Repeats of that action inside the window are only counted, and the
+count is sent as one message once the window closes, e.g. three "louder" turn
+into {"Action": "louder"} followed by {"Action": "louder", "Repeat": 2}.
+A different action closes the window early so the command order is kept.
+
+Pending repeats are flushed by a timer thread and at the start of every
+invocation, and flush_all() sends them all, e.g. on shutdown. This needs a
+long-lived process such as the gateway: a Lambda container runs one invocation
+at a time, so there is no burst to merge within it, and a frozen or recycled
+container would delay or lose the repeats after the user was told "Done".
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore(object):
+    """
+    Pending windows kept in this process. Any object with the same get/put/pop/items
+    methods, e.g. backed by a shared table, can be passed to Coalescer instead.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, entry):
+        self._entries[key] = entry
+
+    def pop(self, key):
+        return self._entries.pop(key, None)
+
+    def items(self):
+        return list(self._entries.items())
+
+
+class Coalescer(object):
+    def __init__(self, window, send, store=None, clock=time.time):
+        """
+        window is in seconds; send(key, action, repeat) publishes one merged command.
+        """
+        self.window = window
+        self.send = send
+        self.store = store if store is not None else MemoryStore()
+        self.merged = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def submit(self, key, action):
+        now = self._clock()
+        to_send = []
+        with self._lock:
+            entry = self.store.get(key)
+            if entry is not None and entry['deadline'] > now and entry['action'].lower() == action.lower():
+                entry['count'] += 1
+                self.store.put(key, entry)
+                self.merged += 1
+                if entry['count'] == 1:
+                    self._schedule(entry['deadline'] - now)
+                return
+            if entry is not None and entry['count']:
+                to_send.append((entry['action'], entry['count']))
+            self.store.put(key, {'action': action, 'count': 0, 'deadline': now + self.window})
+        to_send.append((action, 1))
+        for pending_action, repeat in to_send:
+            self.send(key, pending_action, repeat)
+
+    def flush_due(self):
+        """
+        Send the repeats of every window that has closed.
+        """
+        now = self._clock()
+        with self._lock:
+            keys = [key for key, entry in self.store.items() if entry['deadline'] <= now]
+        self._close(keys)
+
+    def flush_all(self):
+        """
+        Close every window and send its repeats now.
+        """
+        with self._lock:
+            keys = [key for key, _ in self.store.items()]
+        self._close(keys)
+
+    def _close(self, keys):
+        to_send = []
+        with self._lock:
+            for key in keys:
+                entry = self.store.pop(key)
+                if entry is not None and entry['count']:
+                    to_send.append((key, entry['action'], entry['count']))
+        for key, action, repeat in to_send:
+            self.send(key, action, repeat)
+
+    def _schedule(self, delay):
+        # A little slack so the window has surely closed when the timer fires.
+        timer = threading.Timer(delay + 0.005, self._flush_from_timer)
+        timer.daemon = True
+        timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush_due()
+        except Exception:
+            logger.exception('Could not flush coalesced commands')
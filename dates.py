@@ -0,0 +1,50 @@
+"""
+Date parsing for reservation slots.
+
+Lex normally resolves date slots to ISO 8601 (YYYY-MM-DD), which is parsed
+directly; anything else falls back to dateutil, imported on first use. Results
+are memoized, including failures, so validation and pricing can parse the same
+slot value repeatedly for free.
+"""
+
+import datetime
+
+from ttl_cache import TTLCache, MISSING
+
+_parsed = TTLCache(maxsize=512, ttl=None)
+# ASCII only: int() would also take ' 1', '+1', '1_0' and other scripts' digits.
+_DIGITS = frozenset('0123456789')
+
+
+def _parse_iso(value):
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        return None
+    if not all(char in _DIGITS for char in value[:4] + value[5:7] + value[8:]):
+        return None
+    try:
+        return datetime.date(int(value[:4]), int(value[5:7]), int(value[8:]))
+    except ValueError:
+        return None
+
+
+def parse_date(value):
+    """
+    Returns the datetime.date for value, or None if it cannot be parsed.
+    """
+    date = _parse_iso(value)
+    if date is not None:
+        return date
+
+    # dateutil fills missing parts (e.g. the year) from today, so key on the day too.
+    key = (value, datetime.date.today())
+    date = _parsed.get(key)
+    if date is not MISSING:
+        return date
+
+    import dateutil.parser
+    try:
+        date = dateutil.parser.parse(value).date()
+    except ValueError:
+        date = None
+    _parsed.set(key, date)
+    return date
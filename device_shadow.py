@@ -0,0 +1,127 @@
+"""
+In-memory shadow of each device's channel, volume and power state.
+
+The shadow is keyed by the device's command topic and updated from every
+command published to it, and from device reports, which take precedence as
+they are what the device actually did. Entries expire after ttl seconds, since
+the TV can also be changed with its own remote; an expired or unknown field is
+None.
+
+The shadow lives in one container's memory, so state inferred from commands
+misses commands handled elsewhere and changes made with the TV's own remote.
+Only state reported by the device within noop_age seconds is used to drop a
+Turn to the channel already showing; such a report can still be stale, e.g. if
+the TV's own remote was used since, and then a real Turn is dropped. "What is
+on" is answered from any unexpired state without asking the device.
+"""
+
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+FIELDS = ('channel', 'volume', 'power')
+POWER_TOGGLE = {'on': 'off', 'off': 'on'}
+
+
+def _same_channel(a, b):
+    return a is not None and b is not None and (a.lstrip('0') or '0') == (b.lstrip('0') or '0')
+
+
+def _step(value, steps):
+    if value is None:
+        return None
+    try:
+        return int(value) + steps
+    except ValueError:
+        return None
+
+
+class DeviceShadow(object):
+    def __init__(self, ttl=60, maxsize=1024, noop_age=10, clock=time.time):
+        self.noop_age = noop_age
+        self.dropped = 0
+        self._clock = clock
+        self._states = TTLCache(maxsize=maxsize, ttl=ttl, clock=clock)
+        self._lock = threading.Lock()
+
+    def get(self, topic):
+        """
+        Copy of the state of the device on topic, or None when nothing fresh is known.
+        """
+        state = self._states.get(topic, None)
+        return dict(state) if state is not None else None
+
+    def _update(self, topic, state, changes, source):
+        # Called with the lock held, state being what was read under it.
+        state = dict(state or dict.fromkeys(FIELDS))
+        state.update(changes)
+        now = self._clock()
+        # Fields whose value is what the device last reported rather than inferred.
+        reported = set(state.get('reported', ()))
+        if source == 'report':
+            reported.update(changes)
+            state['reported_at'] = now
+        else:
+            reported.difference_update(changes)
+        state['reported'] = tuple(sorted(reported))
+        state['source'] = source
+        state['updated'] = now
+        self._states.set(topic, state)
+
+    def apply(self, topic, message):
+        """
+        Update the shadow with a command published to topic.
+        """
+        with self._lock:
+            state = self._states.get(topic, None)
+            changes = self._changes(state or {}, message)
+            if changes is not None:
+                self._update(topic, state, changes, 'command')
+
+    def _changes(self, state, message):
+        method = message.get('Method')
+        if method == 'Turn':
+            changes = {'channel': u'{}'.format(message['ChannelNumber']), 'power': 'on'}
+        elif method == 'Remote':
+            action = message.get('Action')
+            repeat = message.get('Repeat', 1)
+            if action in ('next', 'back'):
+                channel = _step(state.get('channel'), repeat if action == 'next' else -repeat)
+                changes = {'channel': u'{}'.format(channel) if channel is not None else None}
+            elif action in ('louder', 'smaller'):
+                changes = {'volume': _step(state.get('volume'), repeat if action == 'louder' else -repeat)}
+            elif action == 'power':
+                power = state.get('power')
+                for _ in range(repeat):
+                    power = POWER_TOGGLE.get(power)
+                changes = {'power': power}
+            else:
+                return None
+        else:
+            return None
+        return changes
+
+    def report(self, topic, state):
+        """
+        Merge a state reported by the device; only known fields are taken.
+        """
+        changes = dict((field, state[field]) for field in FIELDS if field in state)
+        if 'channel' in changes and changes['channel'] is not None:
+            changes['channel'] = u'{}'.format(changes['channel'])
+        with self._lock:
+            self._update(topic, self._states.get(topic, None), changes, 'report')
+
+    def is_noop(self, topic, message):
+        """
+        Whether message is a Turn to the channel the device reported showing
+        within noop_age seconds.
+        """
+        if message.get('Method') != 'Turn':
+            return False
+        state = self._states.get(topic, None)
+        if state is None or 'channel' not in state['reported'] or state.get('power') == 'off':
+            return False
+        if self._clock() - state['reported_at'] > self.noop_age:
+            return False
+        return _same_channel(state.get('channel'), u'{}'.format(message['ChannelNumber']))
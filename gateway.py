@@ -0,0 +1,271 @@
+"""
+Self-hosted gateway that serves a Lambda handler file over HTTP (Python 3.7+).
+
+For on-premises setups the same lambda_handler() runs in one long-lived process
+instead of in Lambda: no cold starts, no cloud hop between Lex fulfillment and
+the Pi, and the warm clients, caches and coalescer are shared by all requests.
+Commands go to a local MQTT broker through local_iot (IOT_CLIENT) instead of
+boto3 iot-data.
+
+    python gateway.py [--host 127.0.0.1] [--port 8080] [--workers 16]
+                      [--iot mqtt://localhost:1883] [--handler my_lex-lambda.py]
+                      [--token SECRET]
+
+    POST /         a Lex V1 code hook event; the reply is the handler's response
+    GET  /health   request counters, and the stats() of the handler's publisher
+                   and admission controller when enabled
+
+It listens on localhost only unless --host says otherwise. With --token (or
+GATEWAY_TOKEN) every request must carry 'Authorization: Bearer <token>'; the
+gateway refuses to listen on other interfaces without one.
+
+The HTTP side is asyncio with keep-alive connections. The handlers block on
+publishes and lookups, so each event runs on a thread pool of --workers threads,
+which bounds how many are dispatched at once.
+"""
+
+import argparse
+import asyncio
+import hmac
+import importlib.util
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 1 << 20
+MAX_HEADERS = 100
+LOOPBACK = ('127.0.0.1', '::1', 'localhost')
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class BadRequest(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def load_handler(path):
+    """
+    Import a handler file, whose name need not be a valid module name.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    name = os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class Gateway(object):
+    def __init__(self, handler, workers=16, token=None, stats=None):
+        """
+        handler(event, context) is called on the worker threads; stats() returns
+        extra counters for /health.
+        """
+        self.handler = handler
+        self.token = token
+        self.stats = stats
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dispatch')
+        self.started = time.time()
+        self.served = 0
+        self.failed = 0
+        self.in_flight = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except BadRequest as e:
+                    self._write(writer, e.status, {'errorMessage': str(e)}, False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if self.authorized(headers):
+                    status, payload = await self.route(method, path, body)
+                else:
+                    status, payload = 401, {'errorMessage': 'Missing or wrong bearer token'}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def authorized(self, headers):
+        if self.token is None:
+            return True
+        scheme, _, credentials = headers.get('authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip(), self.token)
+
+    async def _readline(self, reader):
+        try:
+            return await reader.readline()
+        except ValueError:
+            # Longer than the stream limit; readline() raises it for LimitOverrunError.
+            raise BadRequest(400, 'Request line or header is too long')
+
+    async def _read_request(self, reader):
+        line = await self._readline(reader)
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise BadRequest(400, 'Malformed request line')
+        headers = {}
+        for _ in range(MAX_HEADERS + 1):
+            header = await self._readline(reader)
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise BadRequest(400, 'Too many headers')
+        body = b''
+        if method == 'POST':
+            if 'content-length' not in headers:
+                raise BadRequest(411, 'Content-Length is required')
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                raise BadRequest(400, 'Malformed Content-Length')
+            if length > MAX_BODY:
+                raise BadRequest(413, 'Request body is too large')
+            body = await reader.readexactly(length)
+        return method, target.split('?', 1)[0], headers, body
+
+    def _write(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        head = (
+            'HTTP/1.1 {} {}\r\n'
+            'Content-Type: application/json\r\n'
+            'Content-Length: {}\r\n'
+            'Connection: {}\r\n'
+            '\r\n'
+        ).format(status, REASONS[status], len(body), 'keep-alive' if keep_alive else 'close')
+        writer.write(head.encode('latin-1') + body)
+
+    async def route(self, method, path, body):
+        if path == '/health':
+            health = {
+                'status': 'ok',
+                'uptime_s': round(time.time() - self.started, 1),
+                'served': self.served,
+                'failed': self.failed,
+                'in_flight': self.in_flight,
+            }
+            if self.stats is not None:
+                health.update(self.stats())
+            return 200, health
+        if path not in ('/', '/lex'):
+            return 404, {'errorMessage': 'Not found'}
+        if method != 'POST':
+            return 405, {'errorMessage': 'Use POST'}
+        try:
+            event = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return 400, {'errorMessage': 'Body is not JSON'}
+        self.in_flight += 1
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(self.executor, self.handler, event, None)
+        except Exception as e:
+            self.failed += 1
+            logger.exception('Handler failed')
+            # Same shape as a Lambda function error.
+            return 500, {'errorMessage': str(e), 'errorType': type(e).__name__}
+        finally:
+            self.in_flight -= 1
+        self.served += 1
+        return 200, response
+
+
+async def serve(gateway, host, port, stop):
+    server = await asyncio.start_server(gateway.handle_connection, host, port)
+    logger.info('Gateway listening on %s', ', '.join(str(sock.getsockname()) for sock in server.sockets))
+    await stop.wait()
+    server.close()
+    # Idle keep-alive connections would otherwise hold their tasks open.
+    connections = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in connections:
+        task.cancel()
+    await asyncio.gather(*connections, return_exceptions=True)
+    await server.wait_closed()
+
+
+def handler_stats(module):
+    """
+    Counters of the handler module's opt-in components that are enabled.
+    """
+    return dict(
+        (name, getattr(module, name).stats())
+        for name in ('publisher', 'admission')
+        if getattr(module, name, None) is not None
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--iot', default=os.environ.get('IOT_CLIENT', 'mqtt://localhost:1883'),
+                        help="IOT_CLIENT for the handler: 'local' or mqtt://host:port")
+    parser.add_argument('--token', default=os.environ.get('GATEWAY_TOKEN'),
+                        help='bearer token required on every request')
+    parser.add_argument('--handler', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'my_lex-lambda.py'))
+    args = parser.parse_args()
+    if args.host not in LOOPBACK and not args.token:
+        parser.error('--token (or GATEWAY_TOKEN) is required to listen on {}'.format(args.host))
+
+    # Read by the handler module at import.
+    os.environ['IOT_CLIENT'] = args.iot
+    # tracemalloc would count the allocations of concurrent requests too.
+    os.environ.setdefault('PROFILE_ALLOCATIONS', '0')
+    module = load_handler(args.handler)
+    gateway = Gateway(module.lambda_handler, workers=args.workers, token=args.token or None,
+                      stats=lambda: handler_stats(module))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        loop.run_until_complete(serve(gateway, args.host, args.port, stop))
+    finally:
+        gateway.executor.shutdown(wait=True)
+        coalescer = getattr(module, 'remote_coalescer', None)
+        if coalescer is not None:
+            coalescer.flush_all()
+        publisher = getattr(module, 'publisher', None)
+        if publisher is not None:
+            publisher.flush_all(5)
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
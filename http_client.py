@@ -0,0 +1,164 @@
+"""
+Keep-alive HTTP client for the lookup APIs called from the Lambda handlers.
+
+One HTTPClient is created per container and keeps idle connections open between
+warm invocations, so repeat calls skip the TCP and TLS handshakes. Connect and
+read timeouts are separate, and retries are limited both per call and by a
+budget shared by all calls so that a failing endpoint is not hammered.
+"""
+
+import json
+import socket
+import threading
+
+try:
+    import httplib
+    from urlparse import urlsplit
+except ImportError:
+    import http.client as httplib
+    from urllib.parse import urlsplit
+
+
+class HTTPError(Exception):
+    def __init__(self, status, body):
+        Exception.__init__(self, 'HTTP {}'.format(status))
+        self.status = status
+        self.body = body
+
+
+class _StaleConnection(Exception):
+    pass
+
+
+class RetryBudget(object):
+    """
+    Every request deposits ratio tokens (up to max_tokens) and every retry spends one,
+    which caps retries at roughly ratio of the overall request rate.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class HTTPClient(object):
+    def __init__(self, connect_timeout=1.0, read_timeout=3.0, max_retries=1,
+                 retry_budget=None, max_idle=4):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget if retry_budget is not None else RetryBudget()
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    # --- Connection pool ---
+
+    def _acquire(self, origin):
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+
+        scheme, host, port = origin
+        if scheme == 'https':
+            conn = httplib.HTTPSConnection(host, port, timeout=self.connect_timeout)
+        else:
+            conn = httplib.HTTPConnection(host, port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        # Headers and body go out in separate writes; without this Nagle holds the
+        # body back until the previous segment is acked on reused connections.
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, False
+
+    def _release(self, origin, conn):
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+    # --- Requests ---
+
+    def _send(self, origin, method, path, body, headers):
+        conn, reused = self._acquire(origin)
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except Exception as e:
+            conn.close()
+            # The server may have dropped an idle keep-alive connection; that is not
+            # a failure of the endpoint, so retry on a fresh connection for free.
+            if reused and not isinstance(e, socket.timeout) and \
+                    isinstance(e, (socket.error, httplib.HTTPException)):
+                raise _StaleConnection()
+            raise
+        if (response.getheader('connection') or '').lower() == 'close':
+            conn.close()
+        else:
+            self._release(origin, conn)
+        return response.status, data
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        Send a request and return (status, body). Connection errors and 5xx replies
+        are retried while both max_retries and the shared retry budget allow it.
+        """
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = headers or {}
+
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                status, data = self._send(origin, method, path, body, headers)
+            except _StaleConnection:
+                continue
+            except (socket.error, httplib.HTTPException) as e:
+                error = e
+            else:
+                if status < 500:
+                    return status, data
+                error = HTTPError(status, data)
+
+            if attempt >= self.max_retries or not self.retry_budget.withdraw():
+                raise error
+            attempt += 1
+
+    def post_json(self, url, payload):
+        status, data = self.request(
+            'POST',
+            url,
+            json.dumps(payload),
+            {'Content-Type': 'application/json'}
+        )
+        if status >= 400:
+            raise HTTPError(status, data)
+        return json.loads(data)
@@ -0,0 +1,103 @@
+"""
+Suppression of repeated fulfillments when Lex retries a code hook.
+
+Lex retries a fulfillment whose Lambda was slow to answer, and the retry carries
+the same event. Deduplicator fingerprints a fulfillment event (userId, intent,
+slots and the client's per-utterance requestId session attribute) and
+remembers the close() response sent for it for ttl seconds, so a retry gets
+that response back without publishing the command or calling the lookup API
+again.
+
+The first delivery claims the key with an in-progress marker before it runs,
+so a retry that arrives while it is still publishing does not publish again:
+it waits up to wait seconds for the stored response, and otherwise gets
+IN_PROGRESS, which the handler answers with a neutral reply.
+
+Without a requestId a retry cannot be told apart from a user repeating the
+same command ("louder", "louder"), which must be published every time, so such
+events are never deduplicated; with ordinary Lex traffic that sends no
+requestId, nothing is.
+
+Responses are stored as JSON strings, so the default TTLCache can be replaced
+by any store with get(key, default), set(key, value) and pop(key), and
+optionally an atomic add(key, value) that only sets a missing key. The default
+store is per container, while Lex retries often land on another container;
+only a shared store (e.g. a table with a conditional put as add) catches those.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+REQUEST_ID_ATTRIBUTE = 'requestId'
+# Stored under a key while its first delivery runs; never valid JSON for a response.
+IN_PROGRESS = '-'
+
+
+class Deduplicator(object):
+    def __init__(self, ttl=30, maxsize=1024, store=None, wait=1.0, poll=0.02, clock=time.time, sleep=time.sleep):
+        self.store = store if store is not None else TTLCache(maxsize=maxsize, ttl=ttl)
+        self.wait = wait
+        self.poll = poll
+        self.suppressed = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def key(self, event):
+        """
+        Fingerprint of a LexEvent, or None when the client sent no requestId.
+        Call it before the handler changes the session attributes.
+        """
+        request_id = event.session_attributes.get(REQUEST_ID_ATTRIBUTE)
+        if not request_id:
+            return None
+        fingerprint = json.dumps(
+            [event.user_id, event.intent_name, event.slots, request_id],
+            sort_keys=True,
+            separators=(',', ':')
+        )
+        return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+    def _add(self, key):
+        add = getattr(self.store, 'add', None)
+        if add is not None:
+            return add(key, IN_PROGRESS)
+        # Only atomic within this process.
+        with self._lock:
+            if self.store.get(key, None) is not None:
+                return False
+            self.store.set(key, IN_PROGRESS)
+            return True
+
+    def claim(self, key):
+        """
+        None if the caller delivers first and must then set() or release() the key;
+        otherwise the response of the first delivery, or IN_PROGRESS if it has not
+        finished within wait seconds.
+        """
+        deadline = self._clock() + self.wait
+        while True:
+            if self._add(key):
+                return None
+            cached = self.store.get(key, None)
+            if cached is not None and cached != IN_PROGRESS:
+                self.suppressed += 1
+                # A fresh copy every time, since callers may change the response.
+                return json.loads(cached)
+            if cached is not None and self._clock() >= deadline:
+                self.suppressed += 1
+                return IN_PROGRESS
+            self._sleep(self.poll)
+
+    def release(self, key):
+        """
+        Drop a claim whose delivery failed or was not made, so a retry runs again.
+        """
+        self.store.pop(key)
+
+    def set(self, key, response):
+        self.store.set(key, json.dumps(response, separators=(',', ':')))
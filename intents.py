@@ -0,0 +1,122 @@
+"""
+Declarative intent specs, compiled once at import into a dispatch table.
+
+A spec is a dict with:
+    name         intent name as configured in Lex
+    slots        slot names the intent reads
+    normalizers  {slot: normalize}; normalize(value) -> canonical value, or None to keep value
+    validators   {slot: (check, message)}; check(value) -> bool, message may use {} for the value
+    reservation  template stored in sessionAttributes, defaults to ReservationType 'Type' plus every slot
+    topic        MQTT topic the payload is published to on fulfillment
+    payload      template of the published message
+    reply        message returned to Lex on fulfillment, formatted with the slot values
+    unchanged_reply
+                 message returned instead when no device needed the command, defaults to reply
+    fulfill      optional fulfill(event, values) -> reply, event being a LexEvent;
+                 used instead of topic/payload/reply
+
+In templates a string value of '$Slot' is replaced by the value of that slot.
+"""
+
+
+def one_of(values):
+    """
+    Case-insensitive membership check against a frozenset built once.
+    """
+    allowed = frozenset(value.lower() for value in values)
+    return lambda value: value.lower() in allowed
+
+
+def numeric(value):
+    return value.isnumeric()
+
+
+def _compile_template(template):
+    fields = []
+    for key, value in template.items():
+        if isinstance(value, str) and value.startswith('$'):
+            fields.append((key, value[1:], None))
+        else:
+            fields.append((key, None, value))
+    return tuple(fields)
+
+
+def _fill(fields, values):
+    return dict((key, values[slot] if slot is not None else constant) for key, slot, constant in fields)
+
+
+class CompiledIntent(object):
+    __slots__ = (
+        'name', 'slots', 'normalizers', 'validators', 'reservation', 'topic', 'payload', 'reply',
+        'unchanged_reply', 'fulfill'
+    )
+
+    def __init__(self, spec):
+        self.name = spec['name']
+        self.slots = tuple(spec['slots'])
+        normalizers = spec.get('normalizers', {})
+        self.normalizers = tuple((slot, normalizers[slot]) for slot in self.slots if slot in normalizers)
+        validators = spec.get('validators', {})
+        # Checked in slot order so the first invalid slot is the one re-elicited; messages
+        # are unicode so that non-ASCII slot values format on Python 2 as well.
+        self.validators = tuple(
+            (slot, validators[slot][0], u'' + validators[slot][1]) for slot in self.slots if slot in validators
+        )
+        reservation = spec.get('reservation')
+        if reservation is None:
+            reservation = dict((slot, '$' + slot) for slot in self.slots)
+            reservation['ReservationType'] = 'Type'
+        self.reservation = _compile_template(reservation)
+        self.topic = spec.get('topic')
+        self.payload = _compile_template(spec['payload']) if 'payload' in spec else None
+        # Unicode so slot values from the JSON event format cleanly on Python 2 as well.
+        self.reply = u'' + spec['reply'] if 'reply' in spec else None
+        self.unchanged_reply = u'' + spec['unchanged_reply'] if 'unchanged_reply' in spec else self.reply
+        self.fulfill = spec.get('fulfill')
+
+    def normalize(self, slots):
+        """
+        Replace slot values by their canonical form in place, so that Lex gets the
+        canonical values back with Delegate and ElicitSlot.
+        """
+        for slot, normalize in self.normalizers:
+            value = slots.get(slot)
+            if value:
+                canonical = normalize(value)
+                if canonical is not None:
+                    slots[slot] = canonical
+
+    def values(self, slots):
+        slots = slots or {}
+        return dict((slot, slots.get(slot)) for slot in self.slots)
+
+    def validate(self, values):
+        """
+        Returns (violated_slot, message) for the first invalid slot, or None.
+        """
+        for slot, check, message in self.validators:
+            value = values[slot]
+            if value and not check(value):
+                return slot, message.format(value)
+        return None
+
+    def build_reservation(self, values):
+        return _fill(self.reservation, values)
+
+    def build_payload(self, values):
+        return _fill(self.payload, values)
+
+    def build_reply(self, values, changed=True):
+        return (self.reply if changed else self.unchanged_reply).format(**values)
+
+
+def compile_intents(specs):
+    """
+    Dispatch table of intent name -> CompiledIntent.
+    """
+    table = {}
+    for spec in specs:
+        if spec['name'] in table:
+            raise ValueError('Intent {} is declared twice'.format(spec['name']))
+        table[spec['name']] = CompiledIntent(spec)
+    return table
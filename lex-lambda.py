@@ -8,15 +8,35 @@ For instructions on how to set up and test this bot, as well as additional sampl
 visit the Lex Getting Started documentation http://docs.aws.amazon.com/lex/latest/dg/getting-started.html.
 """
 
-import json
 import datetime
 import time
 import os
-import dateutil.parser
 import logging
+from dates import parse_date
+from quote_engine import CAR_TYPE_INDEX, location_cost, car_type_index, room_type_index
+from intents import compile_intents, one_of
+from lex_event import LexEvent
+import profiling
+from session_codec import encode_reservation, set_current_reservation, enforce_budget
+from lex_logging import configure, begin_invocation, end_invocation, stage
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+configure(
+    logger,
+    level=os.environ.get('LOG_LEVEL', 'DEBUG'),
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', '1.0')),
+    json_format=os.environ.get('LOG_FORMAT', 'json') == 'json'
+)
+
+SESSION_BUDGET_BYTES = int(os.environ.get('SESSION_BUDGET_BYTES', '4096'))
+
+# None unless PROFILE_SAMPLE_RATE or PROFILE_SESSION_TRIGGER is set.
+profiler = profiling.from_environ()
+
+# By default, treat the user request as coming from the Asia/Taipei time zone.
+# Set once per container rather than on every event.
+os.environ['TZ'] = 'Asia/Taipei'
+time.tzset()
 
 
 # --- Helpers that build all of the responses ---
@@ -102,17 +122,11 @@ def generate_car_price(location, days, age, car_type):
     The price is fixed for a given pair of locations.
     """
 
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    base_location_cost = 0
-    for i in range(len(location)):
-        base_location_cost += ord(location.lower()[i]) - 97
+    base_location_cost = location_cost(location)
 
     age_multiplier = 1.10 if age < 25 else 1
     # Select economy is car_type is not found
-    if car_type not in car_types:
-        car_type = car_types[0]
-
-    return days * ((100 + base_location_cost) + ((car_types.index(car_type.lower()) * 50) * age_multiplier))
+    return days * ((100 + base_location_cost) + ((car_type_index(car_type) * 50) * age_multiplier))
 
 
 def generate_hotel_price(location, nights, room_type):
@@ -121,17 +135,13 @@ def generate_hotel_price(location, nights, room_type):
     The price is fixed for a pair of location and roomType.
     """
 
-    room_types = ['queen', 'king', 'deluxe']
-    cost_of_living = 0
-    for i in range(len(location)):
-        cost_of_living += ord(location.lower()[i]) - 97
+    cost_of_living = location_cost(location)
 
-    return nights * (100 + cost_of_living + (100 + room_types.index(room_type.lower())))
+    return nights * (100 + cost_of_living + (100 + room_type_index(room_type)))
 
 
 def isvalid_car_type(car_type):
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    return car_type.lower() in car_types
+    return car_type.lower() in CAR_TYPE_INDEX
 
 
 def isvalid_city(city):
@@ -140,21 +150,17 @@ def isvalid_city(city):
 
 
 def isvalid_date(date):
-    try:
-        dateutil.parser.parse(date)
-        return True
-    except ValueError:
-        return False
+    return parse_date(date) is not None
 
 
 def get_day_difference(later_date, earlier_date):
-    later_datetime = dateutil.parser.parse(later_date).date()
-    earlier_datetime = dateutil.parser.parse(earlier_date).date()
+    later_datetime = parse_date(later_date)
+    earlier_datetime = parse_date(earlier_date)
     return abs(later_datetime - earlier_datetime).days
 
 
 def add_days(date, number_of_days):
-    new_date = dateutil.parser.parse(date).date()
+    new_date = parse_date(date)
     new_date += datetime.timedelta(days=number_of_days)
     return new_date.strftime('%Y-%m-%d')
 
@@ -215,40 +221,10 @@ def build_validation_result(isvalid, violated_slot, message_content):
 #     return {'isValid': True}
 
 
-def validate_hotel(slots):
-    action = try_ex(lambda: slots['Action'])
-    # checkin_date = try_ex(lambda: slots['CheckInDate'])
-    # nights = safe_int(try_ex(lambda: slots['Nights']))
-    # room_type = try_ex(lambda: slots['RoomType'])
-
-    if action and not isvalid_city(action):
-        return build_validation_result(
-            False,
-            'Action',
-            'We currently do not support {} as a valid action.  Can you try a different action?'.format(action)
-        )
-
-    # if checkin_date:
-    #     if not isvalid_date(checkin_date):
-    #         return build_validation_result(False, 'CheckInDate', 'I did not understand your check in date.  When would you like to check in?')
-    #     if datetime.datetime.strptime(checkin_date, '%Y-%m-%d').date() <= datetime.date.today():
-    #         return build_validation_result(False, 'CheckInDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
-
-    # if nights is not None and (nights < 1 or nights > 30):
-    #     return build_validation_result(
-    #         False,
-    #         'Nights',
-    #         'You can make a reservations for from one to thirty nights.  How many nights would you like to stay for?'
-    #     )
-
-
-    return {'isValid': True}
-
-
 """ --- Functions that control the bot's behavior --- """
 
 
-def book_hotel(intent_request):
+def book_hotel(intent, event):
     """
     Performs dialog management and fulfillment for booking a hotel.
 
@@ -257,34 +233,31 @@ def book_hotel(intent_request):
     2) Use of sessionAttributes to pass information that can be used to guide conversation
     """
 
-    location = try_ex(lambda: intent_request['currentIntent']['slots']['Action'])
-    # checkin_date = try_ex(lambda: intent_request['currentIntent']['slots']['CheckInDate'])
-    # nights = safe_int(try_ex(lambda: intent_request['currentIntent']['slots']['Nights']))
+    values = intent.values(event.slots)
+    location = values['Action']
+    # checkin_date = event.slot('CheckInDate')
+    # nights = safe_int(event.slot('Nights'))
 
-    # room_type = try_ex(lambda: intent_request['currentIntent']['slots']['RoomType'])
-    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    # room_type = event.slot('RoomType')
+    session_attributes = event.session_attributes
 
     # Load confirmation history and track the current reservation.
-    reservation = json.dumps({
-        'ReservationType': 'Hotel',
-        'Location': location,
-        # 'RoomType': room_type,
-        # 'CheckInDate': checkin_date,
-        # 'Nights': nights
-    })
+    reservation = encode_reservation(intent.build_reservation(values))
 
-    session_attributes['currentReservation'] = reservation
+    set_current_reservation(session_attributes, reservation)
 
-    if intent_request['invocationSource'] == 'DialogCodeHook':
+    if event.is_dialog_hook:
         # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-        validation_result = validate_hotel(intent_request['currentIntent']['slots'])
-        if not validation_result['isValid']:
-            slots = intent_request['currentIntent']['slots']
+        with stage('validate'):
+            violation = intent.validate(values)
+        if violation is not None:
+            validation_result = build_validation_result(False, *violation)
+            slots = event.slots
             slots[validation_result['violatedSlot']] = None
 
             return elicit_slot(
                 session_attributes,
-                intent_request['currentIntent']['name'],
+                intent.name,
                 slots,
                 validation_result['violatedSlot'],
                 validation_result['message']
@@ -297,16 +270,15 @@ def book_hotel(intent_request):
             # price = generate_hotel_price(location, nights, room_type)
             session_attributes['currentReservationPrice'] = 100
         else:
-            try_ex(lambda: session_attributes.pop('currentReservationPrice'))
+            session_attributes.pop('currentReservationPrice', None)
 
-        session_attributes['currentReservation'] = reservation
-        return delegate(session_attributes, intent_request['currentIntent']['slots'])
+        return delegate(session_attributes, event.slots)
 
     # Booking the hotel.  In a real application, this would likely involve a call to a backend service.
-    logger.debug('bookHotel under={}'.format(reservation))
+    logger.debug('bookHotel under=%s', reservation)
 
-    try_ex(lambda: session_attributes.pop('currentReservationPrice'))
-    try_ex(lambda: session_attributes.pop('currentReservation'))
+    session_attributes.pop('currentReservationPrice', None)
+    session_attributes.pop('currentReservation', None)
     session_attributes['lastConfirmedReservation'] = reservation
 
     return close(
@@ -322,20 +294,45 @@ def book_hotel(intent_request):
 # --- Intents ---
 
 
+BOOK_HOTEL = {
+    'name': 'BookHotel',
+    'slots': ('Action',),
+    'validators': {
+        'Action': (
+            one_of(['back', 'next']),
+            'We currently do not support {} as a valid action.  Can you try a different action?'
+        ),
+        # 'CheckInDate', 'Nights' and 'RoomType' are not part of the bot yet.
+    },
+    'reservation': {
+        'ReservationType': 'Hotel',
+        'Location': '$Action',
+    }
+}
+
+# Compiled once at import; the Remote intent is served by the hotel flow as well.
+INTENTS = compile_intents([
+    BOOK_HOTEL,
+    dict(BOOK_HOTEL, name='Remote'),
+])
+
+
 def dispatch(intent_request):
     """
     Called when the user specifies an intent for this bot.
     """
 
-    logger.debug('dispatch userId={}, intentName={}'.format(intent_request['userId'], intent_request['currentIntent']['name']))
+    event = LexEvent(intent_request)
+    logger.debug('dispatch userId=%s, intentName=%s', event.user_id, event.intent_name)
 
-    intent_name = intent_request['currentIntent']['name']
+    intent_name = event.intent_name
 
     # Dispatch to your bot's intent handlers
-    if intent_name == 'BookHotel':
-        return book_hotel(intent_request)
-    if intent_name == 'Remote':
-        return book_hotel(intent_request)
+    intent = INTENTS.get(intent_name)
+    if intent is not None:
+        response = book_hotel(intent, event)
+        enforce_budget(response['sessionAttributes'], SESSION_BUDGET_BYTES)
+        return response
 
     raise Exception('Intent with name ' + intent_name + ' not supported')
 
@@ -348,9 +345,11 @@ def lambda_handler(event, context):
     Route the incoming request based on intent.
     The JSON body of the request is provided in the event slot.
     """
-    # By default, treat the user request as coming from the America/New_York time zone.
-    os.environ['TZ'] = 'Asia/Taipei'
-    time.tzset()
-    logger.debug('event.bot.name={}'.format(event['bot']['name']))
-
-    return dispatch(event)
+    begin_invocation(intent=event['currentIntent']['name'], source=event['invocationSource'])
+    try:
+        logger.debug('event.bot.name=%s', event['bot']['name'])
+        if profiler is not None and profiler.should_profile(event):
+            return profiler.run(dispatch, event)
+        return dispatch(event)
+    finally:
+        end_invocation()
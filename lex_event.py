@@ -0,0 +1,42 @@
+"""
+Typed view over a Lex V1 code hook event.
+
+The event is walked once when the view is created; the fields then refer to the
+same slot and session attribute dicts as the event itself, so nothing is copied
+and changes made through the view are visible in the event.
+"""
+
+
+class LexEvent(object):
+    __slots__ = (
+        'raw',
+        'user_id',
+        'bot_name',
+        'intent_name',
+        'slots',
+        'session_attributes',
+        'invocation_source',
+        'is_dialog_hook',
+        'input_transcript',
+    )
+
+    def __init__(self, event):
+        intent = event['currentIntent']
+        self.raw = event
+        self.user_id = event['userId']
+        self.bot_name = event['bot']['name']
+        self.intent_name = intent['name']
+        slots = intent.get('slots')
+        if slots is None:
+            slots = intent['slots'] = {}
+        self.slots = slots
+        session_attributes = event.get('sessionAttributes')
+        if session_attributes is None:
+            session_attributes = event['sessionAttributes'] = {}
+        self.session_attributes = session_attributes
+        self.invocation_source = event['invocationSource']
+        self.is_dialog_hook = self.invocation_source == 'DialogCodeHook'
+        self.input_transcript = event.get('inputTranscript')
+
+    def slot(self, name):
+        return self.slots.get(name)
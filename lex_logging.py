@@ -0,0 +1,139 @@
+"""
+Structured logging for the Lambda handlers.
+
+Log records are written as one compact JSON object per line. Messages use
+logging's own lazy %-formatting, so a record that is not emitted is never
+formatted. Debug and info logging can be sampled per invocation: the decision is
+kept per thread, since the gateway runs invocations concurrently, and a filter
+on the handlers drops the debug and info records of unsampled invocations.
+
+Each invocation also collects stage timings (validation, lookup, publish, ...)
+and emits them as a single metrics record on the 'metrics' logger, sampled or not.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+
+metrics_logger = logging.getLogger('metrics')
+metrics_logger.setLevel(logging.INFO)
+
+_config = {
+    'logger': logging.getLogger(),
+    'level': logging.DEBUG,
+    'sample_rate': 1.0,
+}
+_local = threading.local()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes warnings and up, metrics, and everything from sampled invocations and
+    from threads outside an invocation.
+    """
+
+    def filter(self, record):
+        return (record.levelno >= logging.WARNING or getattr(_local, 'sampled', True)
+                or record.name == metrics_logger.name)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+def configure(logger, level='DEBUG', sample_rate=1.0, json_format=True):
+    """
+    Set up logger (normally the root logger) once per container.
+    """
+    _config['logger'] = logger
+    _config['level'] = logging.getLevelName(level) if not isinstance(level, int) else level
+    _config['sample_rate'] = sample_rate
+    logger.setLevel(_config['level'])
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+    for handler in logger.handlers:
+        if not any(isinstance(f, SamplingFilter) for f in handler.filters):
+            handler.addFilter(SamplingFilter())
+    if json_format:
+        for handler in logger.handlers:
+            handler.setFormatter(JsonFormatter())
+
+
+class InvocationMetrics(object):
+    __slots__ = ('start', 'stages', 'fields')
+
+    def __init__(self, fields):
+        self.start = time.time()
+        self.stages = {}
+        self.fields = fields
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+
+class _StageTimer(object):
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add(self.name, time.time() - self.start)
+        return False
+
+
+def current_metrics():
+    """
+    Metrics of the invocation running on this thread. Outside an invocation (e.g.
+    a timer thread) a throwaway collector is returned.
+    """
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None:
+        return InvocationMetrics({})
+    return metrics
+
+
+def stage(name):
+    return current_metrics().stage(name)
+
+
+def begin_invocation(**fields):
+    sample_rate = _config['sample_rate']
+    sampled = sample_rate >= 1.0 or random.random() < sample_rate
+    _local.sampled = sampled
+    fields['sampled'] = sampled
+    _local.metrics = InvocationMetrics(fields)
+    return _local.metrics
+
+
+def end_invocation():
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None:
+        return
+    _local.metrics = None
+    _local.sampled = True
+    fields = dict(metrics.fields)
+    fields['total_ms'] = round((time.time() - metrics.start) * 1000.0, 3)
+    fields['stages'] = dict((name, round(seconds * 1000.0, 3)) for name, seconds in metrics.stages.items())
+    metrics_logger.info('invocation', extra={'fields': fields})
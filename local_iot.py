@@ -0,0 +1,87 @@
+"""
+Local stand-ins for the boto3 'iot-data' client.
+
+Both classes implement publish(topic, qos, payload) like the boto3 client, so
+they can be returned by get_iot_client() in place of it:
+
+    LocalIotDataClient  records every publish in memory (tests, benchmarks)
+    MqttIotDataClient   publishes to a local MQTT broker with paho-mqtt
+
+from_url() picks one from an IOT_CLIENT setting: 'local', or
+'mqtt://host[:port]' for a broker.
+"""
+
+import threading
+import time
+
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
+
+
+class PublishedMessage(object):
+    __slots__ = ('topic', 'qos', 'payload', 'timestamp')
+
+    def __init__(self, topic, qos, payload, timestamp):
+        self.topic = topic
+        self.qos = qos
+        self.payload = payload
+        self.timestamp = timestamp
+
+
+class LocalIotDataClient(object):
+    def __init__(self, latency=0.0):
+        """
+        latency seconds are slept in every publish to mimic the IoT API round trip.
+        """
+        self.latency = latency
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def publish(self, topic, qos=0, payload=b'', **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        message = PublishedMessage(topic, qos, payload, time.time())
+        with self._lock:
+            self.messages.append(message)
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def clear(self):
+        with self._lock:
+            del self.messages[:]
+
+
+class MqttIotDataClient(object):
+    def __init__(self, host='localhost', port=1883, client_id=None, timeout=5.0):
+        import paho.mqtt.client as mqtt
+        try:
+            self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id or '')
+        except AttributeError:
+            # paho-mqtt 1.x
+            self._client = mqtt.Client(client_id=client_id or '')
+        self.timeout = timeout
+        self._client.connect(host, port)
+        self._client.loop_start()
+
+    def publish(self, topic, qos=0, payload=b'', **kwargs):
+        info = self._client.publish(topic, payload, qos=qos)
+        if qos:
+            # Same contract as the IoT Data API: return once the broker acknowledged.
+            info.wait_for_publish(self.timeout)
+            if not info.is_published():
+                raise IOError('MQTT publish to {} was not acknowledged'.format(topic))
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def close(self):
+        self._client.loop_stop()
+        self._client.disconnect()
+
+
+def from_url(url):
+    if url == 'local':
+        return LocalIotDataClient()
+    parts = urlsplit(url)
+    if parts.scheme == 'mqtt':
+        return MqttIotDataClient(parts.hostname or 'localhost', parts.port or 1883)
+    raise ValueError('Unsupported IOT_CLIENT {}'.format(url))
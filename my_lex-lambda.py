@@ -1,16 +1,253 @@
-import json
-import datetime
 import time
 import os
-import dateutil.parser
 import logging
-import boto3
-import urllib2
+import threading
+from ttl_cache import TTLCache, MISSING
+from show_index import load_show_index, normalize_show
+from coalescer import Coalescer
+from publisher import AsyncPublisher
+from routing import TopicRouter, FanOut, UnknownDevice, load_routes
+from intents import compile_intents, one_of, numeric
+from normalize import ActionNormalizer, parse_channel
+from lex_event import LexEvent
+from idempotency import Deduplicator, REQUEST_ID_ATTRIBUTE, IN_PROGRESS
+from device_shadow import DeviceShadow
+from resilience import CircuitBreaker, CircuitOpen, Hedger
+from admission import AdmissionController, SHED
+import profiling
+import wire_format
+from session_codec import encode_reservation, set_current_reservation, enforce_budget
+from lex_logging import configure, begin_invocation, end_invocation, current_metrics, stage
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-client = boto3.client('iot-data', region_name='us-east-1')
+configure(
+    logger,
+    level=os.environ.get('LOG_LEVEL', 'DEBUG'),
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', '1.0')),
+    json_format=os.environ.get('LOG_FORMAT', 'json') == 'json'
+)
+# Set once per container rather than on every event.
+os.environ['TZ'] = 'Asia/Taipei'
+time.tzset()
+
+PI_INPUT_TOPIC = 'PiInput'
+
+# None unless PROFILE_SAMPLE_RATE or PROFILE_SESSION_TRIGGER is set.
+profiler = profiling.from_environ()
+
+# boto3 and the HTTP client are only built the first time they are needed, so
+# cold starts that just answer a DialogCodeHook do not pay for them.
+_clients = {}
+_clients_lock = threading.Lock()
+
+# 'local' or 'mqtt://host:port' publishes through local_iot instead of AWS IoT.
+IOT_CLIENT = os.environ.get('IOT_CLIENT')
+
+def get_iot_client():
+    client = _clients.get('iot-data')
+    if client is None:
+        with _clients_lock:
+            client = _clients.get('iot-data')
+            if client is None:
+                if IOT_CLIENT:
+                    import local_iot
+                    client = _clients['iot-data'] = local_iot.from_url(IOT_CLIENT)
+                else:
+                    import boto3
+                    client = _clients['iot-data'] = boto3.client('iot-data', region_name='us-east-1')
+    return client
+
+def get_lookup_http():
+    http = _clients.get('lookup')
+    if http is None:
+        with _clients_lock:
+            http = _clients.get('lookup')
+            if http is None:
+                from http_client import HTTPClient
+                # Kept for the life of the container so warm invocations reuse the connection.
+                http = _clients['lookup'] = HTTPClient(
+                    connect_timeout=float(os.environ.get('LOOKUP_CONNECT_TIMEOUT', '1.0')),
+                    read_timeout=float(os.environ.get('LOOKUP_READ_TIMEOUT', '3.0')),
+                    max_retries=int(os.environ.get('LOOKUP_MAX_RETRIES', '1'))
+                )
+    return http
+
+# With ASYNC_PUBLISH=1 commands are published from a worker thread while the
+# handler builds its reply; dispatch() then waits up to PUBLISH_FLUSH_TIMEOUT
+# for them and replies Failed if one was given up on or is still queued. A
+# command still queued at that point may yet be delivered, or be lost if the
+# container is frozen first, so the user is asked to try again either way.
+publisher = AsyncPublisher(
+    get_iot_client,
+    maxsize=int(os.environ.get('PUBLISH_QUEUE_SIZE', '100'))
+) if os.environ.get('ASYNC_PUBLISH') == '1' else None
+SESSION_BUDGET_BYTES = int(os.environ.get('SESSION_BUDGET_BYTES', '4096'))
+PUBLISH_FLUSH_TIMEOUT = float(os.environ.get('PUBLISH_FLUSH_TIMEOUT', '5'))
+
+SHOW_LOOKUP_URL = os.environ.get('SHOW_LOOKUP_URL', 'https://fpe50kpobl.execute-api.us-east-1.amazonaws.com/zzzz')
+# Show -> channel replies, kept across warm invocations. Replies that are not a
+# channel number are cached as well so unknown shows do not hit the API again.
+show_cache = TTLCache(
+    maxsize=int(os.environ.get('SHOW_CACHE_SIZE', '256')),
+    ttl=int(os.environ.get('SHOW_CACHE_TTL', '300'))
+)
+
+# Fails Watch fast while the lookup API is failing; optionally hedges slow lookups.
+lookup_breaker = CircuitBreaker(
+    'show lookup',
+    failure_rate=float(os.environ.get('LOOKUP_BREAKER_FAILURE_RATE', '0.5')),
+    window=int(os.environ.get('LOOKUP_BREAKER_WINDOW', '20')),
+    reset_timeout=float(os.environ.get('LOOKUP_BREAKER_RESET', '30'))
+)
+lookup_hedger = Hedger(
+    quantile=float(os.environ.get('LOOKUP_HEDGE_QUANTILE', '0.95'))
+) if os.environ.get('LOOKUP_HEDGE') == '1' else None
+
+def build_show_index():
+    source = os.environ.get('SHOW_CATALOGUE')
+    if not source:
+        return None
+    try:
+        return load_show_index(source, get_lookup_http())
+    except Exception:
+        # The lookup API still works without the index, so never fail the cold start.
+        logger.exception('Could not load show catalogue from %s', source)
+        return None
+
+# Optional local catalogue; the lookup API is only called when it has no match.
+show_index = build_show_index()
+
+# Per-user device topics from DEVICE_ROUTES (JSON or a file path); PiInput otherwise.
+router = TopicRouter(PI_INPUT_TOPIC, load_routes(os.environ.get('DEVICE_ROUTES')))
+fan_out = FanOut(int(os.environ.get('FANOUT_THREADS', '8')))
+
+# With PUBLISH_TIMESTAMPS=1 every command carries its publish time ("Sent", epoch
+# seconds) so the Pi consumer can report end-to-end latency.
+PUBLISH_TIMESTAMPS = os.environ.get('PUBLISH_TIMESTAMPS') == '1'
+# application/x-piinput sends the compact binary commands; consumers read both.
+PAYLOAD_CONTENT_TYPE = os.environ.get('PAYLOAD_CONTENT_TYPE', wire_format.CONTENT_TYPE_JSON)
+
 # ---Helper functions
+def encode_command(message):
+    if PUBLISH_TIMESTAMPS:
+        message = dict(message, Sent=round(time.time(), 3))
+    return wire_format.encode(message, PAYLOAD_CONTENT_TYPE)
+
+def _publish(topic, payload):
+    if publisher is not None:
+        return publisher.publish(topic, 1, payload)
+    return get_iot_client().publish(
+            topic=topic,
+            qos=1,
+            payload=payload
+        )
+
+def publish_command(topic, message):
+    with stage('publish'):
+        result = _publish(topic, encode_command(message))
+    if device_shadow is not None:
+        device_shadow.apply(topic, message)
+    return result
+
+def publish_to_devices(topics, message):
+    """
+    Publish message to every topic; a group broadcast goes out concurrently.
+    Devices that recently reported the state the command would set are skipped.
+    Returns the topics published to.
+    """
+    if device_shadow is not None:
+        skipped = [topic for topic in topics if device_shadow.is_noop(topic, message)]
+        if skipped:
+            device_shadow.dropped += len(skipped)
+            current_metrics().fields['noop'] = len(skipped)
+            topics = [topic for topic in topics if topic not in skipped]
+    payload = encode_command(message)
+    with stage('publish'):
+        if len(topics) <= 1 or publisher is not None:
+            # The async publisher only queues, so there is nothing to overlap.
+            for topic in topics:
+                _publish(topic, payload)
+        else:
+            fan_out.map(lambda topic: _publish(topic, payload), topics)
+    if device_shadow is not None:
+        for topic in topics:
+            device_shadow.apply(topic, message)
+    return topics
+
+def route(event, default_topic=PI_INPUT_TOPIC):
+    return router.topics(event.user_id, event.session_attributes, default_topic)
+
+def send_remote(key, action, repeat):
+    message = {"Method": "Remote", "Action": action}
+    if repeat > 1:
+        message["Repeat"] = repeat
+    publish_command(key[1], message)
+
+def build_remote_coalescer():
+    window_ms = int(os.environ.get('COALESCE_WINDOW_MS', '0'))
+    if window_ms <= 0:
+        return None
+    if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+        logger.warning('COALESCE_WINDOW_MS is ignored in Lambda; only the gateway merges repeats')
+        return None
+    return Coalescer(window_ms / 1000.0, send_remote)
+
+# Opt-in merging of repeated Remote actions, keyed on (userId, topic), with
+# COALESCE_WINDOW_MS. Only a long-lived process such as the gateway merges: a
+# Lambda container runs one invocation at a time and may be frozen with repeats
+# still pending, so it is always off in Lambda.
+remote_coalescer = build_remote_coalescer()
+
+def build_deduplicator():
+    ttl = int(os.environ.get('IDEMPOTENCY_TTL', '0'))
+    if ttl <= 0:
+        return None
+    return Deduplicator(
+        ttl=ttl,
+        maxsize=int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '1024')),
+        wait=int(os.environ.get('IDEMPOTENCY_WAIT_MS', '1000')) / 1000.0
+    )
+
+# Opt-in replay of the cached response when Lex retries a fulfillment. Only
+# fulfillments whose session attributes carry a requestId from the client are
+# deduplicated; without one IDEMPOTENCY_TTL has no effect. The cache is per
+# container, so retries that land on another container are only caught when a
+# shared store is passed to Deduplicator.
+deduplicator = build_deduplicator()
+
+def build_device_shadow():
+    ttl = int(os.environ.get('SHADOW_TTL', '0'))
+    if ttl <= 0:
+        return None
+    return DeviceShadow(
+        ttl=ttl,
+        maxsize=int(os.environ.get('SHADOW_SIZE', '1024')),
+        noop_age=int(os.environ.get('SHADOW_NOOP_AGE', '10'))
+    )
+
+# Opt-in device state, kept from published commands and deviceReport events.
+device_shadow = build_device_shadow()
+
+# Intents whose fulfillment publishes to the devices.
+ADMITTED_INTENTS = ('Remote', 'Turn', 'Watch')
+
+def build_admission():
+    user_rate = float(os.environ.get('ADMISSION_USER_RATE', '0'))
+    device_rate = float(os.environ.get('ADMISSION_DEVICE_RATE', '0'))
+    if user_rate <= 0 and device_rate <= 0:
+        return None
+    return AdmissionController(
+        user_rate=max(user_rate, 0),
+        user_burst=int(os.environ.get('ADMISSION_USER_BURST', '5')),
+        device_rate=max(device_rate, 0),
+        device_burst=int(os.environ.get('ADMISSION_DEVICE_BURST', '5')),
+        # Waiting is billed and counts against the Lex timeout, so keep it short.
+        max_wait=int(os.environ.get('ADMISSION_MAX_WAIT_MS', '0')) / 1000.0
+    )
+
+# Opt-in token buckets per userId and per device topic, in commands per second.
+admission = build_admission()
+
 def elicit_slot(session_attributes, intent_name, slots, slot_to_elicit, message):
     return {
         'sessionAttributes': session_attributes,
@@ -32,23 +269,6 @@ def delegate(session_attributes, slots):
         }
     }
 
-def try_ex(func):
-    try:
-        return func()
-    except KeyError:
-        return None
-
-def isvalid_action(action):
-    valid_actions = ['back','next','louder','smaller','power']
-    return action.lower() in valid_actions
-
-def build_validation_result(isvalid,violated_slot,message_content):
-    return {
-        'isValid':isvalid,
-        'violatedSlot':violated_slot,
-        'message':{'contentType':'PlainText','content':message_content}
-    }
-
 def close(session_attributes, fulfillment_state, message):
     response = {
         'sessionAttributes': session_attributes,
@@ -61,204 +281,310 @@ def close(session_attributes, fulfillment_state, message):
 
     return response
 
-def validate_remote(slots):
-    action = try_ex(lambda: slots['Action'])
-    if action and not isvalid_action(action):
-        return build_validation_result(
-            False,
-            'Action',
-            'We currently do not support {} as a valid action.  Can you try a different action?'.format(action)
-        )
-    return {'isValid': True}
-
-def remote(intent_request):
-    action = try_ex(lambda: intent_request['currentIntent']['slots']['Action'])
-    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
-    reservation = json.dumps({
-        'ReservationType': 'Type',
-        'Action': action
-    })
-    session_attributes['currentReservation'] = reservation
-    if intent_request['invocationSource'] == 'DialogCodeHook':
-        validation_result = validate_remote(intent_request['currentIntent']['slots'])
-        if not validation_result['isValid']:
-            slots = intent_request['currentIntent']['slots']
-            slots[validation_result['violatedSlot']] = None
+def handle_intent(intent, event):
+    intent.normalize(event.slots)
+    values = intent.values(event.slots)
+    session_attributes = event.session_attributes
+    reservation = encode_reservation(intent.build_reservation(values))
+    set_current_reservation(session_attributes, reservation)
+    if event.is_dialog_hook:
+        with stage('validate'):
+            violation = intent.validate(values)
+        if violation is not None:
+            violated_slot, message = violation
+            slots = event.slots
+            slots[violated_slot] = None
 
             return elicit_slot(
                 session_attributes,
-                intent_request['currentIntent']['name'],
+                intent.name,
                 slots,
-                validation_result['violatedSlot'],
-                validation_result['message']
+                violated_slot,
+                {'contentType': 'PlainText', 'content': message}
             )
 
-        session_attributes['currentReservation'] = reservation
-        return delegate(session_attributes, intent_request['currentIntent']['slots'])
-    
-    #  In a real application, this would likely involve a call to a backend service.
-    logger.debug('Remote under={}'.format(reservation))
-
-    try_ex(lambda: session_attributes.pop('currentReservation'))
-    session_attributes['lastConfirmedReservation'] = reservation
-
-    response = client.publish(
-            topic='PiInput',
-            qos=1,
-            payload=json.dumps({
-                "Method":"Remote",
-                "Action" : action
-                
-            })
-        )
-    
-    return close(
-        session_attributes,
-        'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': 'Done Action '+action
-        }
-    )
-
-
-def validate_turn(slots):
-    channel_number = try_ex(lambda: slots['ChannelNumber'])
-    if channel_number and not channel_number.isnumeric():
-        return build_validation_result(
-            False,
-            'ChannelNumber',
-            'We currently do not support {} as a valid channel number.  Can you try a different number?'.format(channel_number)
-        )
-    return {'isValid': True}
-
-def turn(intent_request):
-    channel_number = try_ex(lambda: intent_request['currentIntent']['slots']['ChannelNumber'])
-    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
-    reservation = json.dumps({
-        'ReservationType': 'Type',
-        'ChannelNumber': channel_number
-    })
-    session_attributes['currentReservation'] = reservation
-    if intent_request['invocationSource'] == 'DialogCodeHook':
-        validation_result = validate_turn(intent_request['currentIntent']['slots'])
-        if not validation_result['isValid']:
-            slots = intent_request['currentIntent']['slots']
-            slots[validation_result['violatedSlot']] = None
-
-            return elicit_slot(
-                session_attributes,
-                intent_request['currentIntent']['name'],
-                slots,
-                validation_result['violatedSlot'],
-                validation_result['message']
-            )
+        return delegate(session_attributes, event.slots)
 
-        session_attributes['currentReservation'] = reservation
-        return delegate(session_attributes, intent_request['currentIntent']['slots'])
-    
     #  In a real application, this would likely involve a call to a backend service.
-    logger.debug('Remote under={}'.format(reservation))
+    logger.debug('%s under=%s', intent.name, reservation)
 
-    try_ex(lambda: session_attributes.pop('currentReservation'))
+    session_attributes.pop('currentReservation', None)
     session_attributes['lastConfirmedReservation'] = reservation
-    
 
-    # Change topic, qos and payload
-    response = client.publish(
-            topic='PiInput',
-            qos=1,
-            payload=json.dumps({
-                "Method":"Turn",
-                "ChannelNumber" : channel_number
-            })
+    try:
+        if intent.fulfill is not None:
+            content = intent.fulfill(event, values)
+        else:
+            published = publish_to_devices(route(event, intent.topic), intent.build_payload(values))
+            content = intent.build_reply(values, changed=bool(published))
+    except UnknownDevice as e:
+        return close(
+            session_attributes,
+            'Failed',
+            {
+                'contentType': 'PlainText',
+                'content': e.args[0]
+            }
         )
+
     return close(
         session_attributes,
         'Fulfilled',
         {
             'contentType': 'PlainText',
-            'content': 'Done channel '+channel_number
+            'content': content
         }
     )
 
-def watch(intent_request):
-    show = try_ex(lambda: intent_request['currentIntent']['slots']['Show'])
-    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
-    reservation = json.dumps({
-        'ReservationType': 'Type',
-        'Show': show
-    })
-    session_attributes['currentReservation'] = reservation
-    if intent_request['invocationSource'] == 'DialogCodeHook':
-
-        session_attributes['currentReservation'] = reservation
-        return delegate(session_attributes, intent_request['currentIntent']['slots'])
-    
-    #  In a real application, this would likely involve a call to a backend service.
-    logger.debug('Watch under={}'.format(reservation))
-
-    try_ex(lambda: session_attributes.pop('currentReservation'))
-    session_attributes['lastConfirmedReservation'] = reservation
-    print "SHOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOOW" + show
-    data = {
-        'q': show
-    }
-
-    req = urllib2.Request('https://fpe50kpobl.execute-api.us-east-1.amazonaws.com/zzzz')
-    req.add_header('Content-Type', 'application/json')
-    response = urllib2.urlopen(req, json.dumps(data))
-    data = json.loads(response.read())
+def fulfill_remote(event, values):
+    action = values['Action']
+    topics = route(event)
+    if remote_coalescer is not None:
+        for topic in topics:
+            remote_coalescer.submit((event.user_id, topic), action)
+    else:
+        publish_to_devices(topics, {"Method": "Remote", "Action": action})
+    return 'Done Action '+action
+
+def lookup_channel(show):
+    metrics = current_metrics()
+    if show_index is not None:
+        channel_number = show_index.resolve(show)
+        if channel_number is not None:
+            metrics.fields['lookup'] = 'index'
+            return channel_number
+
+    key = normalize_show(show)
+    channel_number = show_cache.get(key)
+    if channel_number is not MISSING:
+        metrics.fields['lookup'] = 'cache'
+        return channel_number
+
+    metrics.fields['lookup'] = 'remote'
+    with metrics.stage('lookup'):
+        data = lookup_breaker.call(remote_lookup, show)
+    channel_number = data['body-json']['errorMessage']
+    show_cache.set(key, channel_number)
+    return channel_number
+
+def remote_lookup(show):
+    post_json = get_lookup_http().post_json
+    if lookup_hedger is not None:
+        return lookup_hedger.call(post_json, SHOW_LOOKUP_URL, {'q': show})
+    return post_json(SHOW_LOOKUP_URL, {'q': show})
+
+def fulfill_watch(event, values):
+    show = values['Show']
+    topics = route(event)
     channel_number =''
     try:
-        channel_number = data['body-json']['errorMessage']
-        print "MMMMMMMMMMMMMMMMMMMMMMMMMMMM  ",channel_number
+        channel_number = lookup_channel(show)
+        logger.debug('Watch show=%s channel=%s', show, channel_number)
         if channel_number.isnumeric():
             # Change topic, qos and payload
-            response = client.publish(
-                    topic='PiInput',
-                    qos=1,
-                    payload=json.dumps({
-                        "Method":"Turn",
-                        "ChannelNumber" : channel_number
-                    })
-                )
-            responseContent = 'Done channel for '+show+' '+channel_number
+            if publish_to_devices(topics, {
+                "Method":"Turn",
+                "ChannelNumber" : channel_number
+            }):
+                responseContent = 'Done channel for '+show+' '+channel_number
+            else:
+                responseContent = show+' is already on, channel '+channel_number
         else :
             responseContent = 'Sorry! There is no '+show+' for you.'+channel_number
-    except:
+    except CircuitOpen:
+        current_metrics().fields['lookup'] = 'open'
+        responseContent = 'Sorry! The TV guide is not available right now, please try again in a minute.'
+    except Exception:
+        logger.exception('Watch failed for show=%s', show)
         channel_number = 'null'
         responseContent ='error'
-    
-    print 'WHAT'
+
+    return responseContent
+
+def fulfill_status(event, values):
+    topics = route(event)
+    state = device_shadow.get(topics[0]) if device_shadow is not None and topics else None
+    if state is None or state['channel'] is None:
+        return 'Sorry! I do not know what is on right now.'
+    if state['power'] == 'off':
+        return 'The TV is off.'
+    return 'Channel ' + state['channel'] + ' is on.'
+
+# The binary wire format numbers actions by their position here.
+VALID_ACTIONS = wire_format.ACTIONS
+
+# Compiled once per container; dispatch() is a single dict lookup.
+INTENTS = compile_intents([
+    {
+        'name': 'Remote',
+        'slots': ('Action',),
+        'normalizers': {'Action': ActionNormalizer()},
+        'validators': {
+            'Action': (
+                one_of(VALID_ACTIONS),
+                'We currently do not support {} as a valid action.  Can you try a different action?'
+            )
+        },
+        'fulfill': fulfill_remote
+    },
+    {
+        'name': 'Turn',
+        'slots': ('ChannelNumber',),
+        'normalizers': {'ChannelNumber': parse_channel},
+        'validators': {
+            'ChannelNumber': (
+                numeric,
+                'We currently do not support {} as a valid channel number.  Can you try a different number?'
+            )
+        },
+        'topic': PI_INPUT_TOPIC,
+        'payload': {'Method': 'Turn', 'ChannelNumber': '$ChannelNumber'},
+        'reply': 'Done channel {ChannelNumber}',
+        'unchanged_reply': 'Channel {ChannelNumber} is already on'
+    },
+    {
+        'name': 'Watch',
+        'slots': ('Show',),
+        'fulfill': fulfill_watch
+    },
+    {
+        'name': 'Status',
+        'slots': (),
+        'fulfill': fulfill_status
+    },
+])
+
+
+def admit(event):
+    """
+    None if the command may go ahead, otherwise the Failed reply for a shed command.
+    """
+    try:
+        topics = route(event)
+    except UnknownDevice:
+        # Fulfillment reports it; only the user's bucket applies.
+        topics = []
+    verdict = admission.admit(event.user_id, topics)
+    current_metrics().fields['admission'] = verdict
+    if verdict != SHED:
+        return None
+    logger.info('Shedding %s for userId=%s over its command rate', event.intent_name, event.user_id)
     return close(
-        session_attributes,
-        'Fulfilled',
+        event.session_attributes,
+        'Failed',
         {
             'contentType': 'PlainText',
-            'content': responseContent
+            'content': 'Too many commands at once. Please wait a moment and try again.'
         }
     )
 
 
+def confirm_delivery(event):
+    """
+    None once every command of this invocation is acknowledged, otherwise the
+    Failed reply.
+    """
+    with stage('flush'):
+        flushed = publisher.flush(PUBLISH_FLUSH_TIMEOUT)
+    failures = publisher.failures()
+    if flushed and not failures:
+        return None
+    logger.error('Commands for userId=%s not delivered: %s given up on, %s still queued',
+                 event.user_id, failures, publisher.pending())
+    current_metrics().fields['delivery'] = 'failed'
+    return close(
+        event.session_attributes,
+        'Failed',
+        {
+            'contentType': 'PlainText',
+            'content': 'Sorry, the TV did not get that command. Please try again.'
+        }
+    )
 
 
 def dispatch(intent_request):
-    logger.debug('dispatch userId={}, intentName={}'.format(intent_request['userId'], intent_request['currentIntent']['name']))
-    intent_name = intent_request['currentIntent']['name']
-
-    if intent_name == 'Remote':
-        return remote(intent_request)
-    elif intent_name == 'Turn':
-        return turn(intent_request)
-    elif intent_name == 'Watch':
-        return watch(intent_request)
+    event = LexEvent(intent_request)
+    logger.debug('dispatch userId=%s, intentName=%s', event.user_id, event.intent_name)
+    intent_name = event.intent_name
+
+    intent = INTENTS.get(intent_name)
+    if intent is not None:
+        dedup_key = None
+        if deduplicator is not None and not event.is_dialog_hook:
+            dedup_key = deduplicator.key(event)
+            # Not echoed back, so an id the client does not renew cannot match the next command.
+            event.session_attributes.pop(REQUEST_ID_ATTRIBUTE, None)
+            response = deduplicator.claim(dedup_key) if dedup_key is not None else None
+            if response is IN_PROGRESS:
+                logger.info('Duplicate fulfillment for userId=%s while the first is still running', event.user_id)
+                current_metrics().fields['dedup'] = 'in_progress'
+                return close(
+                    event.session_attributes,
+                    'Fulfilled',
+                    {
+                        'contentType': 'PlainText',
+                        'content': 'Still working on your last command.'
+                    }
+                )
+            if response is not None:
+                logger.info('Duplicate fulfillment for userId=%s, returning the cached response', event.user_id)
+                current_metrics().fields['dedup'] = 'hit'
+                return response
+        try:
+            if admission is not None and not event.is_dialog_hook and intent.name in ADMITTED_INTENTS:
+                # After the duplicate check, so Lex retries are not charged twice,
+                # and not cached, so a later retry by the user is admitted again.
+                response = admit(event)
+                if response is not None:
+                    if dedup_key is not None:
+                        deduplicator.release(dedup_key)
+                    return response
+            response = handle_intent(intent, event)
+            if publisher is not None:
+                undelivered = confirm_delivery(event)
+                if undelivered is not None:
+                    # Not cached, so a Lex retry publishes again.
+                    if dedup_key is not None:
+                        deduplicator.release(dedup_key)
+                    return undelivered
+        except Exception:
+            if dedup_key is not None:
+                deduplicator.release(dedup_key)
+            raise
+        enforce_budget(response['sessionAttributes'], SESSION_BUDGET_BYTES)
+        if dedup_key is not None:
+            deduplicator.set(dedup_key, response)
+        return response
 
     raise Exception('Intent with name ' + intent_name + ' not supported')
 
 
+def handle_device_report(report):
+    """
+    Device state sent as {"deviceReport": {"topic": ..., "channel": ..., "volume": ..., "power": ...}},
+    e.g. by an IoT rule on the devices' state topic or through the gateway.
+    """
+    if device_shadow is not None:
+        device_shadow.report(report.get('topic', PI_INPUT_TOPIC), report)
+    return {'status': 'ok'}
+
+
 def lambda_handler(event, context):
-    os.environ['TZ'] = 'Asia/Taipei'
-    time.tzset()
-    logger.debug('event.bot.name{}'.format(event['bot']['name']))
-    return dispatch(event)
\ No newline at end of file
+    if 'deviceReport' in event:
+        return handle_device_report(event['deviceReport'])
+    begin_invocation(intent=event['currentIntent']['name'], source=event['invocationSource'])
+    if publisher is not None:
+        publisher.begin()
+    try:
+        if remote_coalescer is not None:
+            remote_coalescer.flush_due()
+        logger.debug('event.bot.name=%s', event['bot']['name'])
+        if profiler is not None and profiler.should_profile(event):
+            return profiler.run(dispatch, event)
+        return dispatch(event)
+    finally:
+        if publisher is not None:
+            with stage('flush'):
+                if not publisher.flush(PUBLISH_FLUSH_TIMEOUT):
+                    logger.warning('Returning with %s commands still in flight', publisher.pending())
+        end_invocation()
@@ -0,0 +1,220 @@
+"""
+Normalization of spoken Action and ChannelNumber slot values, built once at import.
+
+Lex passes slot values through as heard, so "volume up" or "channel forty two"
+used to fail validation and cost a re-prompt. ActionNormalizer maps phrases to
+the canonical actions through a synonym table, then through a symmetric-delete
+index over the synonyms for near misses ("volume upp", "prevous"). parse_channel() reads channel
+numbers written as digits or as number words ("forty two", "four two",
+"one hundred and five"), with filler words such as "channel" ignored.
+
+Both return None when they cannot resolve a value unambiguously; the raw value
+is then validated as before.
+"""
+
+import re
+
+from show_index import edit_distance
+
+# Spoken phrase -> canonical action of the Remote intent.
+ACTION_SYNONYMS = {
+    'louder': 'louder',
+    'volume up': 'louder',
+    'turn it up': 'louder',
+    'turn up': 'louder',
+    'turn up the volume': 'louder',
+    'increase volume': 'louder',
+    'increase the volume': 'louder',
+    'raise the volume': 'louder',
+    'up': 'louder',
+    'smaller': 'smaller',
+    'quieter': 'smaller',
+    'softer': 'smaller',
+    'volume down': 'smaller',
+    'turn it down': 'smaller',
+    'turn down': 'smaller',
+    'turn down the volume': 'smaller',
+    'decrease volume': 'smaller',
+    'lower the volume': 'smaller',
+    'down': 'smaller',
+    'next': 'next',
+    'next channel': 'next',
+    'channel up': 'next',
+    'forward': 'next',
+    'skip': 'next',
+    'back': 'back',
+    'previous': 'back',
+    'previous channel': 'back',
+    'channel down': 'back',
+    'go back': 'back',
+    # Power is a toggle, so phrases that name a direction ("turn off") are left
+    # out rather than risk switching the TV on.
+    'power': 'power',
+    'power button': 'power',
+    'toggle power': 'power',
+}
+
+NUMBER_WORDS = dict((word, i) for i, word in enumerate((
+    'zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine',
+    'ten', 'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen',
+    'seventeen', 'eighteen', 'nineteen',
+)))
+NUMBER_WORDS['oh'] = 0
+TENS_WORDS = dict((word, (i + 2) * 10) for i, word in enumerate((
+    'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety',
+)))
+CHANNEL_FILLER = frozenset(('channel', 'number', 'to', 'on', 'the', 'please', 'and', 'a'))
+
+# Shorter phrases are only matched exactly; one edit turns "of" into "on" or "off".
+MIN_FUZZY_LENGTH = 4
+
+_NON_WORD = re.compile(r'[^\w\s]+', re.UNICODE)
+
+
+def normalize_phrase(value):
+    return ' '.join(_NON_WORD.sub(' ', value.lower()).split())
+
+
+def _deletes(word, depth):
+    """
+    word and every string made from it by deleting up to depth characters.
+    """
+    variants = set([word])
+    frontier = [word]
+    for _ in range(depth):
+        deeper = []
+        for variant in frontier:
+            for i in range(len(variant)):
+                shorter = variant[:i] + variant[i + 1:]
+                if shorter not in variants:
+                    variants.add(shorter)
+                    deeper.append(shorter)
+        frontier = deeper
+    return variants
+
+
+class DeletionIndex(object):
+    """
+    Symmetric-delete index: two strings within edit distance k share a string
+    reachable from both by at most k deletions, so a query only looks up its own
+    deletions and checks the few candidates found, instead of comparing against
+    every word.
+    """
+
+    def __init__(self, words=(), max_distance=2):
+        self.max_distance = max_distance
+        self._index = {}
+        for word in words:
+            for variant in _deletes(word, max_distance):
+                self._index.setdefault(variant, []).append(word)
+
+    def search(self, word, limit):
+        """
+        [(distance, match)] for every word within limit (at most max_distance) of word.
+        """
+        limit = min(limit, self.max_distance)
+        candidates = set()
+        for variant in _deletes(word, limit):
+            candidates.update(self._index.get(variant, ()))
+        found = []
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, limit)
+            if distance <= limit:
+                found.append((distance, candidate))
+        return found
+
+
+class ActionNormalizer(object):
+    def __init__(self, synonyms=None, cache_size=1024):
+        synonyms = ACTION_SYNONYMS if synonyms is None else synonyms
+        self.synonyms = dict((normalize_phrase(phrase), action) for phrase, action in synonyms.items())
+        self.index = DeletionIndex(self.synonyms)
+        self.cache_size = cache_size
+        # Fuzzy results, since the same near misses come back again and again.
+        self._fuzzy_cache = {}
+
+    def __call__(self, value):
+        """
+        Canonical action for value, or None.
+        """
+        key = normalize_phrase(value)
+        if not key:
+            return None
+        action = self.synonyms.get(key)
+        if action is not None or len(key) < MIN_FUZZY_LENGTH:
+            return action
+        try:
+            return self._fuzzy_cache[key]
+        except KeyError:
+            pass
+        action = self._fuzzy(key)
+        if len(self._fuzzy_cache) >= self.cache_size:
+            self._fuzzy_cache.clear()
+        self._fuzzy_cache[key] = action
+        return action
+
+    def _fuzzy(self, key):
+        matches = self.index.search(key, max(1, len(key) // 5))
+        if not matches:
+            return None
+        best = min(distance for distance, _ in matches)
+        actions = set(self.synonyms[phrase] for distance, phrase in matches if distance == best)
+        if len(actions) == 1:
+            return actions.pop()
+        return None
+
+
+def parse_number_words(words):
+    """
+    Digits for a list of number words: a digit sequence ("four two" -> '42') or a
+    cardinal ("forty two" -> '42', "one hundred five" -> '105'). None if invalid,
+    including sequences that only sum to a number ("twenty one hundred").
+    """
+    if all(word.isdigit() or word in NUMBER_WORDS and NUMBER_WORDS[word] < 10 for word in words):
+        return ''.join(word if word.isdigit() else str(NUMBER_WORDS[word]) for word in words)
+    total = 0
+    current = 0
+    previous = None
+    for word in words:
+        if word in NUMBER_WORDS:
+            if previous in ('unit', 'teen') or (previous == 'tens' and NUMBER_WORDS[word] >= 10):
+                return None
+            current += NUMBER_WORDS[word]
+            previous = 'unit' if NUMBER_WORDS[word] < 10 else 'teen'
+        elif word in TENS_WORDS:
+            if previous in ('unit', 'teen', 'tens'):
+                return None
+            current += TENS_WORDS[word]
+            previous = 'tens'
+        elif word == 'hundred':
+            # Only a single digit multiplies: "one hundred", not "twenty one hundred";
+            # a bare "(a) hundred" is 100.
+            if previous not in ('unit', None, 'thousand') or current >= 10:
+                return None
+            current = (current or 1) * 100
+            previous = 'hundred'
+        elif word == 'thousand':
+            if total or not current or previous == 'thousand':
+                return None
+            total = current * 1000
+            current = 0
+            previous = 'thousand'
+        else:
+            return None
+    return str(total + current)
+
+
+def parse_channel(value):
+    """
+    Channel number digits for value, e.g. u'42' for "channel forty-two", or None.
+    """
+    if _NON_WORD.search(value.replace('-', ' ')):
+        # "4.1" is not channel 41; left for the validator to reject.
+        return None
+    words = [word for word in normalize_phrase(value.replace('-', ' ')).split() if word not in CHANNEL_FILLER]
+    if not words:
+        return None
+    digits = parse_number_words(words)
+    if digits is None:
+        return None
+    return u'' + digits
@@ -0,0 +1,347 @@
+"""
+PiInput consumer for the Raspberry Pi next to the TV.
+
+Subscribes to the command topic on a local MQTT broker (bridged to AWS IoT),
+and runs the commands the Lambda handlers publish:
+
+    {"Method": "Remote", "Action": "louder", "Repeat": 2}
+    {"Method": "Turn", "ChannelNumber": "42"}
+
+in JSON or in the binary format of wire_format.py, which is deployed next to it.
+Commands are queued and a worker thread executes them in order, as IR key
+presses through LIRC's irsend or as HDMI-CEC key presses through cec-client.
+The worker waits for a short quiet window before executing and collapses the
+burst it collected: "louder" x3 becomes one command with Repeat 3, "louder"
+then "smaller" cancel out, and a Turn makes earlier channel steps pointless.
+
+For every executed command a status message is published on the status topic
+with the end-to-end latency of the oldest command merged into it. That is
+measured from the "Sent" field (set by the handler with PUBLISH_TIMESTAMPS=1,
+so it includes any clock skew with the Lambda) or else from receipt.
+
+    python pi_consumer.py [--host localhost] [--port 1883] [--topic PiInput]
+                          [--status-topic PiStatus] [--backend ir|cec|dry-run]
+                          [--ir-remote TV] [--window 0.1] [--max-delay 0.5]
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import wire_format
+
+logger = logging.getLogger(__name__)
+
+# Remote actions that step the volume or the channel up (+1) or down (-1).
+STEPS = {
+    'louder': ('volume', 1),
+    'smaller': ('volume', -1),
+    'next': ('channel', 1),
+    'back': ('channel', -1),
+}
+STEP_ACTIONS = {
+    'volume': ('louder', 'smaller'),
+    'channel': ('next', 'back'),
+}
+
+
+class CommandFailed(Exception):
+    pass
+
+
+class Command(object):
+    __slots__ = ('method', 'action', 'channel', 'repeat', 'sources')
+
+    def __init__(self, method, action=None, channel=None, repeat=1, sources=None):
+        self.method = method
+        self.action = action
+        self.channel = channel
+        self.repeat = repeat
+        # (sent, received) times of every command merged into this one.
+        self.sources = sources if sources is not None else []
+
+    def describe(self):
+        if self.method == 'Turn':
+            return {'Method': 'Turn', 'ChannelNumber': self.channel}
+        return {'Method': 'Remote', 'Action': self.action, 'Repeat': self.repeat}
+
+
+def parse_command(payload, received):
+    """
+    A Command from a raw MQTT payload, or None when it is not a valid command.
+    """
+    try:
+        message = wire_format.decode(payload)
+        method = message['Method']
+        sent = message.get('Sent')
+        sources = [(float(sent) if sent is not None else received, received)]
+        if method == 'Remote':
+            action = message['Action'].lower()
+            repeat = int(message.get('Repeat', 1))
+            if repeat < 1:
+                return None
+            return Command('Remote', action=action, repeat=repeat, sources=sources)
+        if method == 'Turn':
+            channel = str(message['ChannelNumber'])
+            if not channel.isdigit():
+                return None
+            return Command('Turn', channel=channel, sources=sources)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+    return None
+
+
+def _signed_steps(command):
+    axis, sign = STEPS[command.action]
+    return axis, sign * command.repeat
+
+
+def collapse(commands):
+    """
+    Merge a burst of commands into the fewest that have the same effect, in order.
+    A merged Remote can end up with Repeat 0, which is reported but not executed.
+    """
+    merged = []
+    for command in commands:
+        last = merged[-1] if merged else None
+        if last is not None and command.method == 'Remote' and last.method == 'Remote' \
+                and command.action in STEPS and last.action in STEPS:
+            axis, steps = _signed_steps(command)
+            last_axis, last_steps = _signed_steps(last)
+            if axis == last_axis:
+                total = last_steps + steps
+                up, down = STEP_ACTIONS[axis]
+                if total:
+                    last.action = up if total > 0 else down
+                last.repeat = abs(total)
+                last.sources.extend(command.sources)
+                continue
+        if last is not None and command.method == 'Turn' and \
+                (last.method == 'Turn' or STEPS.get(last.action, ('',))[0] == 'channel'):
+            # The channel ends up wherever this Turn says.
+            command.sources = last.sources + command.sources
+            merged[-1] = command
+            continue
+        merged.append(command)
+    return merged
+
+
+def _run(args, stdin=None):
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE if stdin is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    out, err = process.communicate(stdin)
+    if process.returncode:
+        message = err.decode('utf-8', 'replace').strip()
+        raise CommandFailed('{} exited with {}: {}'.format(args[0], process.returncode, message))
+    return out
+
+
+class IrBackend(object):
+    KEYS = {
+        'louder': 'KEY_VOLUMEUP',
+        'smaller': 'KEY_VOLUMEDOWN',
+        'next': 'KEY_CHANNELUP',
+        'back': 'KEY_CHANNELDOWN',
+        'power': 'KEY_POWER',
+    }
+
+    def __init__(self, remote='TV', irsend='irsend'):
+        self.remote = remote
+        self.irsend = irsend
+
+    def execute(self, command):
+        if command.method == 'Turn':
+            keys = ['KEY_{}'.format(digit) for digit in command.channel]
+            _run([self.irsend, 'SEND_ONCE', self.remote] + keys)
+            return
+        key = self.KEYS.get(command.action)
+        if key is None:
+            raise CommandFailed('No IR key for {}'.format(command.action))
+        _run([self.irsend, '--count={}'.format(command.repeat), 'SEND_ONCE', self.remote, key])
+
+
+class CecBackend(object):
+    # HDMI-CEC user control codes.
+    CODES = {
+        'louder': 0x41,
+        'smaller': 0x42,
+        'next': 0x30,
+        'back': 0x31,
+        'power': 0x40,
+    }
+
+    def __init__(self, cec_client='cec-client', adapter_address='1', tv_address='0'):
+        self.cec_client = cec_client
+        self.header = '{}{}'.format(adapter_address, tv_address)
+
+    def _presses(self, codes):
+        lines = []
+        for code in codes:
+            lines.append('tx {}:44:{:02x}'.format(self.header, code))
+            lines.append('tx {}:45'.format(self.header))
+        return ('\n'.join(lines) + '\n').encode('ascii')
+
+    def execute(self, command):
+        if command.method == 'Turn':
+            codes = [0x20 + int(digit) for digit in command.channel]
+        else:
+            code = self.CODES.get(command.action)
+            if code is None:
+                raise CommandFailed('No CEC key for {}'.format(command.action))
+            codes = [code] * command.repeat
+        _run([self.cec_client, '-s', '-d', '1'], stdin=self._presses(codes))
+
+
+class DryRunBackend(object):
+    def execute(self, command):
+        logger.info('Would execute %s', command.describe())
+
+
+class Consumer(object):
+    def __init__(self, backend, window=0.1, max_delay=0.5, report=None, clock=time.time):
+        """
+        A burst is collected until window seconds pass without a new command, or
+        max_delay seconds after its first command. report(status) is called with
+        the status of every executed command.
+        """
+        self.backend = backend
+        self.window = window
+        self.max_delay = max_delay
+        self.report = report
+        self.received = 0
+        self.executed = 0
+        self.failed = 0
+        self._clock = clock
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def submit(self, payload):
+        command = parse_command(payload, self._clock())
+        if command is None:
+            logger.warning('Ignoring invalid command %r', payload)
+            return
+        self.received += 1
+        self._queue.put(command)
+
+    def next_batch(self, timeout=None):
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = self._clock() + self.max_delay
+        while True:
+            wait = min(self.window, deadline - self._clock())
+            if wait <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def run_once(self, timeout=None):
+        for command in collapse(self.next_batch(timeout)):
+            self.execute(command)
+
+    def execute(self, command):
+        start = self._clock()
+        ok = True
+        if command.method == 'Turn' or command.repeat:
+            try:
+                self.backend.execute(command)
+                self.executed += 1
+            except Exception:
+                ok = False
+                self.failed += 1
+                logger.exception('Could not execute %s', command.describe())
+        done = self._clock()
+        sent, received = min(command.sources)
+        status = command.describe()
+        status.update({
+            'Ok': ok,
+            'Merged': len(command.sources),
+            'LatencyMs': round((done - sent) * 1000.0, 1),
+            'QueueMs': round((start - received) * 1000.0, 1),
+            'ExecMs': round((done - start) * 1000.0, 1),
+        })
+        if self.report is not None:
+            try:
+                self.report(status)
+            except Exception:
+                logger.exception('Could not report status')
+        return status
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Consumer worker failed')
+
+    def start(self):
+        self._worker = threading.Thread(target=self._run, name='pi-consumer')
+        self._worker.daemon = True
+        self._worker.start()
+
+
+def build_backend(args):
+    if args.backend == 'ir':
+        return IrBackend(remote=args.ir_remote)
+    if args.backend == 'cec':
+        return CecBackend()
+    return DryRunBackend()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--topic', default='PiInput')
+    parser.add_argument('--status-topic', default='PiStatus')
+    parser.add_argument('--backend', choices=('ir', 'cec', 'dry-run'), default='ir')
+    parser.add_argument('--ir-remote', default='TV', help='remote name in the LIRC configuration')
+    parser.add_argument('--window', type=float, default=0.1, help='quiet seconds that end a burst')
+    parser.add_argument('--max-delay', type=float, default=0.5, help='longest a command waits for its burst')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    import paho.mqtt.client as mqtt
+    try:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    except AttributeError:
+        client = mqtt.Client()
+
+    def report(status):
+        client.publish(args.status_topic, json.dumps(status, separators=(',', ':')), qos=0)
+
+    consumer = Consumer(build_backend(args), window=args.window, max_delay=args.max_delay, report=report)
+
+    def on_connect(client, userdata, flags, rc):
+        # Also runs after a reconnect, which needs the subscription again.
+        client.subscribe(args.topic, qos=1)
+        logger.info('Subscribed to %s on %s:%s', args.topic, args.host, args.port)
+
+    def on_message(client, userdata, message):
+        consumer.submit(message.payload)
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    consumer.start()
+    client.connect(args.host, args.port)
+    client.loop_forever()
+
+
+if __name__ == '__main__':
+    main()
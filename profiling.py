@@ -0,0 +1,131 @@
+"""
+Opt-in profiling of single invocations.
+
+A sampled fraction of invocations (PROFILE_SAMPLE_RATE), or any invocation whose
+session attributes carry profile=true when PROFILE_SESSION_TRIGGER=1, runs under
+cProfile and tracemalloc (Python 3 only). A compact summary of the top functions
+and top allocation sites is appended as a JSON line to PROFILE_OUTPUT, or logged
+on the 'profile' logger when no file is set.
+
+from_environ() returns None when neither trigger is configured, and the handlers
+then call dispatch() directly, so profiling costs nothing while it is off.
+
+tracemalloc is process-wide, so when invocations run concurrently (the gateway)
+only one is profiled at a time and the others run unprofiled; allocation
+tracking can be turned off there with PROFILE_ALLOCATIONS=0, since it also
+counts the other invocations' allocations.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger('profile')
+logger.setLevel(logging.INFO)
+
+# Held while an invocation is profiled.
+_active = threading.Lock()
+
+
+class Profiler(object):
+    def __init__(self, sample_rate=0.0, session_trigger=False, top=15, output=None, allocations=True):
+        self.sample_rate = sample_rate
+        self.allocations = allocations
+        self.session_trigger = session_trigger
+        self.top = top
+        self.output = output
+
+    def should_profile(self, event):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if self.session_trigger:
+            session_attributes = event.get('sessionAttributes') or {}
+            return str(session_attributes.get('profile', '')).lower() == 'true'
+        return False
+
+    def run(self, func, event):
+        if not _active.acquire(False):
+            return func(event)
+        try:
+            return self._run(func, event)
+        finally:
+            _active.release()
+
+    def _run(self, func, event):
+        # Imported here so that cold starts with profiling off do not pay for pstats.
+        import cProfile
+        tracemalloc = None
+        if self.allocations:
+            try:
+                import tracemalloc
+            except ImportError:
+                pass
+
+        profile = cProfile.Profile()
+        if tracemalloc is not None:
+            tracemalloc.start()
+        start = time.time()
+        try:
+            return profile.runcall(func, event)
+        finally:
+            elapsed = time.time() - start
+            snapshot = tracemalloc.take_snapshot() if tracemalloc is not None else None
+            if tracemalloc is not None:
+                tracemalloc.stop()
+            try:
+                self.write(self.summarize(event, elapsed, profile, snapshot))
+            except Exception:
+                logger.exception('Could not write profile summary')
+
+    def summarize(self, event, elapsed, profile, snapshot):
+        import pstats
+        stats = pstats.Stats(profile).stats
+        functions = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+        summary = {
+            'intent': event['currentIntent']['name'],
+            'source': event['invocationSource'],
+            'total_ms': round(elapsed * 1000.0, 3),
+            'functions': [
+                {
+                    'func': '{}:{}({})'.format(os.path.basename(filename), line, name),
+                    'calls': calls,
+                    'tottime_ms': round(tottime * 1000.0, 3),
+                    'cumtime_ms': round(cumtime * 1000.0, 3),
+                }
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in functions
+            ],
+        }
+        if snapshot is not None:
+            summary['allocations'] = [
+                {
+                    'site': '{}:{}'.format(os.path.basename(stat.traceback[0].filename), stat.traceback[0].lineno),
+                    'bytes': stat.size,
+                    'count': stat.count,
+                }
+                for stat in snapshot.statistics('lineno')[:self.top]
+            ]
+        return summary
+
+    def write(self, summary):
+        if self.output:
+            with open(self.output, 'a') as f:
+                f.write(json.dumps(summary, separators=(',', ':')) + '\n')
+        else:
+            logger.info('profile', extra={'fields': summary})
+
+
+def from_environ(environ=os.environ):
+    sample_rate = float(environ.get('PROFILE_SAMPLE_RATE', '0'))
+    session_trigger = environ.get('PROFILE_SESSION_TRIGGER') == '1'
+    if not sample_rate and not session_trigger:
+        return None
+    return Profiler(
+        sample_rate=sample_rate,
+        session_trigger=session_trigger,
+        top=int(environ.get('PROFILE_TOP', '15')),
+        output=environ.get('PROFILE_OUTPUT'),
+        allocations=environ.get('PROFILE_ALLOCATIONS', '1') == '1'
+    )
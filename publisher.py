@@ -0,0 +1,161 @@
+"""
+Background publisher for the IoT Data API.
+
+Handlers put commands on a bounded in-flight queue and return; a worker thread
+sends them with client.publish and retries until the broker has accepted them
+(for QoS 1 the publish call only succeeds once the message is acknowledged).
+flush() waits for the messages published from the calling thread and is called
+before the Lambda returns, so no message is left behind when the container is
+frozen. In the gateway each request runs on its own thread, so a request only
+waits for its own commands; flush_all() waits for every message, e.g. on
+shutdown.
+"""
+
+import logging
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending(object):
+    # Messages in flight from one thread, and how many were given up on; guarded by AsyncPublisher._idle.
+    __slots__ = ('count', 'failed')
+
+    def __init__(self):
+        self.count = 0
+        self.failed = 0
+
+
+class AsyncPublisher(object):
+    def __init__(self, get_client, maxsize=100, max_attempts=3, retry_delay=0.05):
+        """
+        get_client returns the iot-data client; it is called from the worker thread.
+        """
+        self.get_client = get_client
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.acked = 0
+        self.failed = 0
+        self.retried = 0
+        self._queue = queue.Queue(maxsize)
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self._local = threading.local()
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='iot-publisher')
+            self._worker.daemon = True
+            self._worker.start()
+
+    def publish(self, topic, qos, payload):
+        """
+        Queue a message. When the queue is full the message is sent on the caller's
+        thread instead, which slows the caller down rather than dropping commands.
+        """
+        pending = self._pending()
+        with self._idle:
+            self._in_flight += 1
+            pending.count += 1
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((topic, qos, payload, pending))
+        except queue.Full:
+            self._deliver(topic, qos, payload, pending)
+
+    def _pending(self):
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            pending = self._local.pending = _Pending()
+        return pending
+
+    def _deliver(self, topic, qos, payload, pending):
+        acked = False
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    self.get_client().publish(topic=topic, qos=qos, payload=payload)
+                    acked = True
+                    return
+                except Exception:
+                    if attempt == self.max_attempts:
+                        logger.error('Dropped command to %s after %s attempts: %r', topic, attempt, payload,
+                                     exc_info=True)
+                        return
+                    self.retried += 1
+                    time.sleep(self.retry_delay * attempt)
+        finally:
+            with self._idle:
+                if acked:
+                    self.acked += 1
+                else:
+                    self.failed += 1
+                    pending.failed += 1
+                self._in_flight -= 1
+                pending.count -= 1
+                if not self._in_flight or not pending.count:
+                    self._idle.notify_all()
+
+    def _run(self):
+        while True:
+            topic, qos, payload, pending = self._queue.get()
+            self._deliver(topic, qos, payload, pending)
+
+    def begin(self):
+        """
+        Count the calling thread's messages afresh, e.g. at the start of an
+        invocation, so that an earlier one's late failures are not reported.
+        """
+        self._local.pending = _Pending()
+
+    def failures(self):
+        """
+        Messages from the calling thread given up on since begin().
+        """
+        return self._pending().failed
+
+    def pending(self):
+        """
+        Messages in flight from the calling thread.
+        """
+        return self._pending().count
+
+    def flush(self, timeout=None):
+        """
+        Wait until every message published from the calling thread has been
+        acknowledged or given up on. Returns False if some are still in flight
+        after timeout seconds.
+        """
+        pending = self._pending()
+        return self._wait(lambda: pending.count, timeout)
+
+    def flush_all(self, timeout=None):
+        """
+        Like flush(), for the messages of every thread.
+        """
+        return self._wait(lambda: self._in_flight, timeout)
+
+    def _wait(self, in_flight, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._idle:
+            while in_flight():
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stats(self):
+        return {
+            'in_flight': self._in_flight,
+            'acked': self.acked,
+            'failed': self.failed,
+            'retried': self.retried
+        }
@@ -0,0 +1,175 @@
+"""
+Bounding the latency of calls to a degraded dependency (the show lookup API).
+
+CircuitBreaker tracks the outcome of the last calls. Once the failure rate over
+that window reaches failure_rate it opens, and calls fail at once with
+CircuitOpen instead of waiting for the dependency. After reset_timeout seconds
+it is half-open and lets a single probe call through; a success closes it
+again, a failure opens it for another reset_timeout.
+
+Hedger sends a second, identical request when the first has not answered within
+the observed latency quantile (p95 by default) and returns whichever answer
+comes first. Hedges are paid for from a RetryBudget so that a slow dependency
+does not get twice the traffic.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=5, reset_timeout=30.0, clock=time.time):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+            return True
+
+    def record(self, success):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if success:
+                    logger.warning('Circuit %s closed', self.name)
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(success)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._outcomes.count(False) >= self.failure_rate * calls:
+                self._open()
+
+    def _open(self):
+        logger.warning('Circuit %s open for %ss', self.name, self.reset_timeout)
+        self.state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+
+    def call(self, func, *args):
+        if not self.allow():
+            raise CircuitOpen('{} is unavailable'.format(self.name))
+        try:
+            result = func(*args)
+        except Exception:
+            self.record(False)
+            raise
+        self.record(True)
+        return result
+
+
+class Hedger(object):
+    def __init__(self, quantile=0.95, min_samples=20, history=200, budget=None, clock=time.time):
+        """
+        No hedge is sent until min_samples latencies have been observed.
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        if budget is None:
+            # Imported here: http_client pulls in http.client, which the cold start avoids.
+            from http_client import RetryBudget
+            budget = RetryBudget(ratio=0.1, max_tokens=5.0)
+        self.budget = budget
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=history)
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def deadline(self):
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.quantile))]
+
+    def _observe(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _timed(self, func, args):
+        start = self._clock()
+        result = func(*args)
+        self._observe(self._clock() - start)
+        return result
+
+    def call(self, func, *args):
+        self.budget.deposit()
+        delay = self.deadline()
+        if delay is None:
+            return self._timed(func, args)
+
+        results = queue.Queue()
+
+        def attempt(index):
+            try:
+                results.put((index, True, self._timed(func, args)))
+            except Exception as e:
+                results.put((index, False, e))
+
+        self._start(attempt, 0)
+        pending = 1
+        try:
+            first = results.get(timeout=delay)
+        except queue.Empty:
+            first = None
+            if self.budget.withdraw():
+                self.hedged += 1
+                self._start(attempt, 1)
+                pending += 1
+        while True:
+            index, ok, value = first if first is not None else results.get()
+            first = None
+            pending -= 1
+            if ok:
+                if index:
+                    self.hedge_wins += 1
+                return value
+            if not pending:
+                raise value
+
+    def _start(self, target, index):
+        # Daemon thread: a losing attempt finishes in the background and is ignored.
+        thread = threading.Thread(target=target, args=(index,), name='hedge-{}'.format(index))
+        thread.daemon = True
+        thread.start()
@@ -0,0 +1,167 @@
+"""
+Routing of commands to per-device MQTT topics, and concurrent group fan-out.
+
+Without configuration every command goes to the intent's default topic
+(PiInput), as before. A device can be picked through session attributes:
+
+    device=bedroom        one device
+    device=tv,bedroom     several devices
+    deviceGroup=upstairs  a group from the routing table ('all' means every device)
+
+The routing table maps a userId to its devices, groups and default device:
+
+    {"alice": {"devices": {"tv": "home/alice/tv", "bedroom": "home/alice/bedroom"},
+               "groups": {"upstairs": ["bedroom"]},
+               "default": "tv"}}
+
+A user with a devices table can only address those devices. For other users in
+the table a device name becomes the '<default topic>/<device>' topic; users not
+in the table cannot pick a device, since the session attributes come from the
+client.
+
+FanOut publishes one message to many topics on a small pool of worker threads,
+so a broadcast takes about as long as the slowest single publish.
+"""
+
+import json
+import logging
+import re
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+logger = logging.getLogger(__name__)
+
+DEVICE_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class UnknownDevice(ValueError):
+    pass
+
+
+def load_routes(source):
+    """
+    The routing table from a JSON string or a JSON file path; {} when source is empty.
+    """
+    if not source:
+        return {}
+    if source.lstrip().startswith('{'):
+        return json.loads(source)
+    with open(source) as f:
+        return json.load(f)
+
+
+class TopicRouter(object):
+    def __init__(self, default_topic, routes=None):
+        self.default_topic = default_topic
+        self.routes = routes or {}
+
+    def topics(self, user_id, session_attributes, default_topic=None):
+        """
+        The topics a command from user_id goes to, in a stable order.
+        """
+        default_topic = default_topic or self.default_topic
+        listed = user_id in self.routes
+        entry = self.routes.get(user_id) or {}
+        group = session_attributes.get('deviceGroup')
+        if group:
+            names = self._group(entry, group)
+        else:
+            device = session_attributes.get('device') or entry.get('default')
+            if not device:
+                return [default_topic]
+            names = [name.strip() for name in device.split(',') if name.strip()]
+            if not names:
+                raise UnknownDevice(u'{} does not name a device.'.format(device))
+        return [self._topic(listed, entry, name, default_topic) for name in names]
+
+    def _group(self, entry, group):
+        names = entry.get('groups', {}).get(group)
+        if names is None and group == 'all' and entry.get('devices'):
+            names = sorted(entry['devices'])
+        if not names:
+            raise UnknownDevice(u'There is no device group called {}.'.format(group))
+        return names
+
+    def _topic(self, listed, entry, name, default_topic):
+        devices = entry.get('devices')
+        if devices or not listed:
+            topic = (devices or {}).get(name)
+            if topic is None:
+                raise UnknownDevice(u'There is no device called {}.'.format(name))
+            return topic
+        if not DEVICE_NAME.match(name):
+            # Keeps MQTT wildcards and separators out of generated topics.
+            raise UnknownDevice(u'{} is not a valid device name.'.format(name))
+        return '{}/{}'.format(default_topic, name)
+
+
+class _Batch(object):
+    def __init__(self, size):
+        self.results = [None] * size
+        self.errors = []
+        self._remaining = size
+        self._done = threading.Condition()
+
+    def run(self, index, func, item):
+        try:
+            self.results[index] = func(item)
+        except Exception as e:
+            logger.warning('Fan-out call for %s failed', item, exc_info=True)
+            self.errors.append(e)
+        with self._done:
+            self._remaining -= 1
+            if not self._remaining:
+                self._done.notify_all()
+
+    def wait(self):
+        with self._done:
+            while self._remaining:
+                self._done.wait()
+
+
+class FanOut(object):
+    def __init__(self, size=8):
+        """
+        size worker threads, started on the first fan-out and kept for the container.
+        """
+        self.size = size
+        self._queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.size:
+                worker = threading.Thread(target=self._run, name='fan-out-{}'.format(len(self._workers)))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        while True:
+            batch, index, func, item = self._queue.get()
+            batch.run(index, func, item)
+
+    def map(self, func, items):
+        """
+        func(item) for every item, concurrently, results in order. Every call is
+        made even when some fail; the first error is raised afterwards.
+        """
+        items = list(items)
+        if len(items) <= 1 or self.size <= 1:
+            return [func(item) for item in items]
+        self._ensure_workers()
+        batch = _Batch(len(items))
+        for index in range(1, len(items)):
+            self._queue.put((batch, index, func, items[index]))
+        # The caller's thread takes the first item instead of just waiting.
+        batch.run(0, func, items[0])
+        batch.wait()
+        if batch.errors:
+            raise batch.errors[0]
+        return batch.results
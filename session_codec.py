@@ -0,0 +1,123 @@
+"""
+Compact encoding of reservations kept in Lex session attributes.
+
+Lex sends the whole sessionAttributes map back and forth on every turn, so
+reservations are stored as '1' followed by minified JSON with short keys, with
+empty slots and the default ReservationType left out. A current reservation
+equal to the last confirmed one is stored as SAME_AS_LAST instead of a second
+copy. decode_reservation() and get_reservation() read both this format and
+the plain JSON written by older versions, so handlers only ever see the full
+dict.
+
+This changes what currentReservation and lastConfirmedReservation hold on the
+wire: earlier versions stored plain JSON with the full key names. A client that
+reads these attributes itself must now strip the '1' version prefix, map the
+short keys back (KEY_ALIASES) and resolve '=' to lastConfirmedReservation, or
+use decode_reservation() / get_reservation().
+
+enforce_budget() keeps the map under a byte budget by dropping the attributes
+that can be rebuilt, least important first.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSION = '1'
+SAME_AS_LAST = '='
+DEFAULT_RESERVATION_TYPE = 'Type'
+
+KEY_ALIASES = {
+    'ReservationType': 't',
+    'Action': 'a',
+    'ChannelNumber': 'c',
+    'Show': 's',
+    'Location': 'l',
+    'RoomType': 'r',
+    'CheckInDate': 'd',
+    'Nights': 'n',
+}
+KEY_NAMES = dict((alias, key) for key, alias in KEY_ALIASES.items())
+
+# Dropped in this order when the session attributes are over budget.
+DROPPABLE = ('lastConfirmedReservation', 'currentReservationPrice')
+
+
+def encode_reservation(reservation):
+    compact = {}
+    for key, value in reservation.items():
+        if value is None:
+            continue
+        if key == 'ReservationType' and value == DEFAULT_RESERVATION_TYPE:
+            continue
+        compact[KEY_ALIASES.get(key, key)] = value
+    return VERSION + json.dumps(compact, separators=(',', ':'), sort_keys=True)
+
+
+def decode_reservation(value):
+    if value is None:
+        return None
+    if value.startswith(VERSION + '{'):
+        compact = json.loads(value[len(VERSION):])
+        reservation = dict((KEY_NAMES.get(key, key), item) for key, item in compact.items())
+        reservation.setdefault('ReservationType', DEFAULT_RESERVATION_TYPE)
+        return reservation
+    return json.loads(value)
+
+
+def set_current_reservation(session_attributes, reservation):
+    """
+    Store an encoded reservation as currentReservation, as a back-reference when
+    it is unchanged from the last confirmed one.
+    """
+    if session_attributes.get('lastConfirmedReservation') == reservation:
+        session_attributes['currentReservation'] = SAME_AS_LAST
+    else:
+        session_attributes['currentReservation'] = reservation
+
+
+def get_reservation(session_attributes, key):
+    value = session_attributes.get(key)
+    if value == SAME_AS_LAST:
+        value = session_attributes.get('lastConfirmedReservation')
+    return decode_reservation(value)
+
+
+def _utf8_size(value):
+    if isinstance(value, bytes):
+        return len(value)
+    if not isinstance(value, type(u'')):
+        value = u'{}'.format(value)
+    return len(value.encode('utf-8'))
+
+
+def _entry_size(key, value):
+    # Close enough to the serialized size without serializing: quotes, colon and comma per entry.
+    return _utf8_size(key) + _utf8_size(value) + 6
+
+
+def session_size(session_attributes):
+    """
+    Approximate size of the attributes in UTF-8 bytes.
+    """
+    return sum(_entry_size(key, value) for key, value in session_attributes.items())
+
+
+def enforce_budget(session_attributes, budget):
+    size = session_size(session_attributes)
+    for key in DROPPABLE:
+        if size <= budget:
+            break
+        value = session_attributes.get(key)
+        if value is None:
+            continue
+        if key == 'lastConfirmedReservation' and session_attributes.get('currentReservation') == SAME_AS_LAST:
+            # Resolve the back-reference before dropping what it points to.
+            session_attributes['currentReservation'] = value
+            size += _utf8_size(value) - _utf8_size(SAME_AS_LAST)
+        del session_attributes[key]
+        size -= _entry_size(key, value)
+    if size > budget:
+        logger.warning('Session attributes are %s bytes, over the %s byte budget', size, budget)
+    return session_attributes
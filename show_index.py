@@ -0,0 +1,110 @@
+"""
+Local show -> channel index used by watch() before falling back to the lookup API.
+
+The catalogue is a JSON object mapping show names to channel numbers, for example
+{"News at Nine": "42", "Cartoon Hour": "7"}, read from a bundled file or downloaded
+once at cold start. Names are kept in a sorted array so a spoken prefix can be
+found with a binary search, and near misses are resolved by a bounded edit distance.
+"""
+
+import bisect
+import json
+
+
+def normalize_show(show):
+    return ' '.join(show.lower().split())
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance between a and b, or limit + 1 as soon as it is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        best = i
+        for j, cb in enumerate(b, 1):
+            cost = previous[j - 1] + (ca != cb)
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current.append(cost)
+            if cost < best:
+                best = cost
+        if best > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class ShowIndex(object):
+    def __init__(self, catalogue):
+        entries = sorted((normalize_show(name), u'{}'.format(channel)) for name, channel in catalogue.items())
+        self.names = [name for name, _ in entries]
+        self.channels = [channel for _, channel in entries]
+        self._exact = dict(entries)
+        # Names bucketed by length; an edit distance of k only needs lengths within k.
+        self._by_length = {}
+        for name, channel in entries:
+            self._by_length.setdefault(len(name), []).append((name, channel))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prefix(self, key):
+        start = bisect.bisect_left(self.names, key)
+        end = bisect.bisect_left(self.names, key + u'\uffff', start)
+        matches = set(self.channels[start:end])
+        # Only answer when every show starting with key is on the same channel.
+        if len(matches) == 1:
+            return matches.pop()
+        return None
+
+    def _fuzzy(self, key):
+        limit = max(1, len(key) // 5)
+        best_distance = limit + 1
+        best = set()
+        for length in range(len(key) - limit, len(key) + limit + 1):
+            for name, channel in self._by_length.get(length, ()):
+                distance = edit_distance(key, name, min(limit, best_distance))
+                if distance < best_distance:
+                    best_distance = distance
+                    best = set([channel])
+                elif distance == best_distance and distance <= limit:
+                    best.add(channel)
+        if len(best) == 1:
+            return best.pop()
+        return None
+
+    def resolve(self, show):
+        """
+        Channel for show, trying an exact, prefix and then fuzzy match. None if no
+        unambiguous match was found.
+        """
+        key = normalize_show(show)
+        if not key:
+            return None
+        channel = self._exact.get(key)
+        if channel is None:
+            channel = self._prefix(key)
+        if channel is None:
+            channel = self._fuzzy(key)
+        return channel
+
+
+def load_show_index(source, http=None):
+    """
+    Build a ShowIndex from a catalogue file path or an http(s) URL fetched with http.
+    """
+    if source.startswith('http://') or source.startswith('https://'):
+        status, data = http.request('GET', source)
+        if status != 200:
+            raise ValueError('Could not download show catalogue, HTTP {}'.format(status))
+        catalogue = json.loads(data)
+    else:
+        with open(source) as f:
+            catalogue = json.load(f)
+    return ShowIndex(catalogue)
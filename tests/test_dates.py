@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import datetime
+import unittest
+
+from dates import _parse_iso, parse_date
+
+
+class ParseIsoTest(unittest.TestCase):
+    def test_strict_iso_dates(self):
+        self.assertEqual(_parse_iso(u'2030-01-31'), datetime.date(2030, 1, 31))
+        self.assertEqual(parse_date(u'2030-01-31'), datetime.date(2030, 1, 31))
+
+    def test_rejects_what_int_would_accept(self):
+        for value in (u'2030-01- 1', u'2030-+1-01', u'2030-1_-01', u' 203-01-01', u'2030-01-0١', u'2030-01-\xb9\xb9'):
+            self.assertIsNone(_parse_iso(value), repr(value))
+
+    def test_rejects_other_shapes_and_invalid_dates(self):
+        for value in (u'2030/01/31', u'30-01-2030', u'2030-02-30', u'2030-1-1', u'tomorrow'):
+            self.assertIsNone(_parse_iso(value), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
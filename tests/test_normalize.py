@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from normalize import ACTION_SYNONYMS, ActionNormalizer, DeletionIndex, parse_channel, parse_number_words
+from show_index import edit_distance
+
+
+class ActionNormalizerTest(unittest.TestCase):
+    def setUp(self):
+        self.normalize = ActionNormalizer()
+
+    def test_canonical_actions_map_to_themselves(self):
+        for action in ('louder', 'smaller', 'next', 'back', 'power'):
+            self.assertEqual(self.normalize(action), action)
+
+    def test_every_synonym(self):
+        for phrase, action in ACTION_SYNONYMS.items():
+            self.assertEqual(self.normalize(phrase), action, phrase)
+
+    def test_case_and_punctuation_are_ignored(self):
+        self.assertEqual(self.normalize(u'Turn it DOWN!'), 'smaller')
+        self.assertEqual(self.normalize(u'  Volume   up. '), 'louder')
+
+    def test_near_misses(self):
+        self.assertEqual(self.normalize(u'volume upp'), 'louder')
+        self.assertEqual(self.normalize(u'loudr'), 'louder')
+        self.assertEqual(self.normalize(u'prevous'), 'back')
+        self.assertEqual(self.normalize(u'turn it dwn'), 'smaller')
+
+    def test_fuzzy_results_are_cached(self):
+        self.assertEqual(self.normalize(u'prevous'), 'back')
+        self.assertEqual(self.normalize._fuzzy_cache[u'prevous'], 'back')
+        self.assertEqual(self.normalize(u'prevous'), 'back')
+
+    def test_near_miss_limit_grows_with_length(self):
+        # One edit for short phrases: "louda" is two away from "louder".
+        self.assertIsNone(self.normalize(u'louda'))
+        self.assertEqual(self.normalize(u'increse volum'), 'louder')
+
+    def test_rejects(self):
+        for value in (u'banana', u'', u'!!', u'café', u'nxt', u'of'):
+            self.assertIsNone(self.normalize(value), value)
+
+    def test_power_directions_are_not_guessed(self):
+        # Power is a toggle; "turn off" must not become it.
+        for value in (u'turn off', u'turn on', u'power off', u'power on', u'on', u'off', u'switch off'):
+            self.assertIsNone(self.normalize(value), value)
+
+    def test_ambiguous_near_miss_is_rejected(self):
+        normalize = ActionNormalizer({'tune up': 'louder', 'tune op': 'smaller'})
+        self.assertIsNone(normalize(u'tune xp'))
+        self.assertEqual(normalize(u'tune upp'), 'louder')
+
+
+class DeletionIndexTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        words = [phrase for phrase in ACTION_SYNONYMS]
+        index = DeletionIndex(words, max_distance=2)
+        for query in (u'volume upp', u'turn it dwn', u'prevous', u'skipp', u'swich off', u'increse volume'):
+            for limit in (1, 2):
+                expected = sorted((edit_distance(query, word, 99), word) for word in words
+                                  if edit_distance(query, word, 99) <= limit)
+                self.assertEqual(sorted(index.search(query, limit)), expected, (query, limit))
+
+
+class ParseChannelTest(unittest.TestCase):
+    def test_digits(self):
+        self.assertEqual(parse_channel(u'42'), u'42')
+        self.assertEqual(parse_channel(u'channel 7'), u'7')
+        self.assertEqual(parse_channel(u'007'), u'007')
+
+    def test_number_words(self):
+        cases = {
+            u'forty two': u'42',
+            u'channel forty-two': u'42',
+            u'Forty Two please': u'42',
+            u'four two': u'42',
+            u'zero seven': u'07',
+            u'oh seven': u'07',
+            u'nineteen': u'19',
+            u'one hundred and five': u'105',
+            u'a hundred': u'100',
+            u'two thousand and one': u'2001',
+            u'one thousand two hundred five': u'1205',
+        }
+        for value, channel in cases.items():
+            self.assertEqual(parse_channel(value), channel, value)
+
+    def test_rejects(self):
+        for value in (u'4.1', u'4,1', u'news', u'', u'channel', u'twenty twenty', u'five fifteen',
+                      u'twenty one hundred', u'one hundred hundred', u'five hundred one hundred',
+                      u'thousand', u'thousand thousand', u'two thousand three thousand', u'forty café'):
+            self.assertIsNone(parse_channel(value), value)
+
+    def test_parse_number_words(self):
+        self.assertEqual(parse_number_words(['twenty', 'one']), '21')
+        self.assertIsNone(parse_number_words(['one', 'twenty']))
+        self.assertIsNone(parse_number_words(['twenty', 'eleven']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+from session_codec import (
+    DEFAULT_RESERVATION_TYPE, SAME_AS_LAST, decode_reservation, encode_reservation, enforce_budget,
+    get_reservation, session_size, set_current_reservation
+)
+
+
+class ReservationEncodingTest(unittest.TestCase):
+    def test_round_trip(self):
+        reservation = {'ReservationType': 'Hotel', 'Location': u'München', 'RoomType': u'café', 'Nights': '2'}
+        self.assertEqual(decode_reservation(encode_reservation(reservation)), reservation)
+
+    def test_round_trip_restores_default_type_and_drops_empty_slots(self):
+        encoded = encode_reservation({'ReservationType': DEFAULT_RESERVATION_TYPE, 'Show': u'Café Tivoli', 'Action': None})
+        self.assertEqual(encoded, u'1{"s":"Caf\\u00e9 Tivoli"}')
+        self.assertEqual(decode_reservation(encoded), {'ReservationType': DEFAULT_RESERVATION_TYPE, 'Show': u'Café Tivoli'})
+
+    def test_decodes_plain_json_of_older_versions(self):
+        reservation = {'ReservationType': 'Type', 'ChannelNumber': '42'}
+        self.assertEqual(decode_reservation(json.dumps(reservation)), reservation)
+        self.assertIsNone(decode_reservation(None))
+
+    def test_same_as_last_back_reference(self):
+        encoded = encode_reservation({'ReservationType': 'Type', 'ChannelNumber': u'42'})
+        session_attributes = {'lastConfirmedReservation': encoded}
+        set_current_reservation(session_attributes, encoded)
+        self.assertEqual(session_attributes['currentReservation'], SAME_AS_LAST)
+        self.assertEqual(get_reservation(session_attributes, 'currentReservation'), decode_reservation(encoded))
+
+        changed = encode_reservation({'ReservationType': 'Type', 'ChannelNumber': u'7'})
+        set_current_reservation(session_attributes, changed)
+        self.assertEqual(session_attributes['currentReservation'], changed)
+
+
+class EnforceBudgetTest(unittest.TestCase):
+    def attributes(self):
+        return {
+            'currentReservation': SAME_AS_LAST,
+            'lastConfirmedReservation': encode_reservation({'Location': u'München', 'Nights': '3'}),
+            'currentReservationPrice': '100',
+            'note': u'café',
+        }
+
+    def test_size_counts_utf8_bytes(self):
+        self.assertEqual(session_size({u'note': u'café'}), len('note') + len(u'café'.encode('utf-8')) + 6)
+
+    def test_under_budget_is_untouched(self):
+        attributes = self.attributes()
+        self.assertEqual(enforce_budget(dict(attributes), 4096), attributes)
+
+    def test_drops_last_confirmed_first_and_resolves_back_reference(self):
+        attributes = self.attributes()
+        last = attributes['lastConfirmedReservation']
+        budget = session_size(attributes) - 1
+        trimmed = enforce_budget(attributes, budget)
+        self.assertNotIn('lastConfirmedReservation', trimmed)
+        self.assertEqual(trimmed['currentReservation'], last)
+        self.assertIn('currentReservationPrice', trimmed)
+        self.assertLessEqual(session_size(trimmed), budget)
+
+    def test_drops_price_next_and_keeps_the_rest(self):
+        trimmed = enforce_budget(self.attributes(), 10)
+        self.assertEqual(sorted(trimmed), ['currentReservation', 'note'])
+
+
+if __name__ == '__main__':
+    unittest.main()
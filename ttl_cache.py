@@ -0,0 +1,68 @@
+"""
+Small in-process cache with a time-to-live and least-recently-used eviction.
+
+Instances are meant to be created at module level so that they survive across
+warm Lambda invocations of the same container.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+MISSING = object()
+
+
+class TTLCache(object):
+    """
+    Bounded mapping whose entries expire after ttl seconds (never if ttl is None)
+    and which evicts the least recently used entry once maxsize is reached.
+    """
+
+    def __init__(self, maxsize=256, ttl=300, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            if item is not MISSING:
+                expires, value = item
+                if expires is None or expires > self._clock():
+                    # Move to the most recently used end.
+                    del self._data[key]
+                    self._data[key] = item
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+            elif len(self._data) >= self.maxsize:
+                self._data.popitem(last=False)
+            self._data[key] = (expires, value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, MISSING)
+        return default if item is MISSING else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
@@ -0,0 +1,141 @@
+"""
+Encoding of the commands published on the PiInput topics.
+
+Two content types are supported:
+
+    application/json       {"Method": "Turn", "ChannelNumber": "42"}, as always
+    application/x-piinput  a versioned binary encoding, 7 bytes for that command
+
+The binary layout (version 1, big-endian) is a header of magic byte 0xA7,
+version, method code and flags, followed by:
+
+    Remote  action code (1 byte; 0 means a length-prefixed UTF-8 action follows),
+            Repeat as uint16 when FLAG_REPEAT is set
+    Turn    ChannelNumber as a length-prefixed UTF-8 string
+    both    Sent as uint64 milliseconds when FLAG_SENT is set
+
+Action codes are positions in ACTIONS + 1, so ACTIONS may only be appended to.
+decode() recognises either format from the first byte, so consumers accept both
+and publishers can switch format without a coordinated upgrade. Messages the
+binary format cannot express are sent as JSON.
+"""
+
+import json
+import struct
+
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_BINARY = 'application/x-piinput'
+
+MAGIC = 0xA7
+VERSION = 1
+
+METHODS = ('Remote', 'Turn')
+METHOD_CODES = dict((method, i + 1) for i, method in enumerate(METHODS))
+ACTIONS = ('back', 'next', 'louder', 'smaller', 'power')
+ACTION_CODES = dict((action, i + 1) for i, action in enumerate(ACTIONS))
+
+FLAG_REPEAT = 0x01
+FLAG_SENT = 0x02
+
+_HEADER = struct.Struct('>BBBB')
+_BYTE = struct.Struct('>B')
+_REPEAT = struct.Struct('>H')
+_SENT = struct.Struct('>Q')
+_FIELDS = frozenset(('Method', 'Action', 'Repeat', 'ChannelNumber', 'Sent'))
+
+
+def _pack_string(value):
+    data = value.encode('utf-8')
+    if len(data) > 255:
+        raise ValueError('String too long for the binary format')
+    return _BYTE.pack(len(data)) + data
+
+
+def _unpack_string(payload, offset):
+    length = _BYTE.unpack_from(payload, offset)[0]
+    offset += 1
+    if offset + length > len(payload):
+        raise ValueError('Truncated binary command')
+    return payload[offset:offset + length].decode('utf-8'), offset + length
+
+
+def encode_binary(message):
+    """
+    Raises ValueError for a message the binary format cannot express.
+    """
+    if not _FIELDS.issuperset(message):
+        raise ValueError('Unknown fields for the binary format')
+    method = METHOD_CODES.get(message.get('Method'))
+    if method is None:
+        raise ValueError('Unknown method for the binary format')
+    flags = 0
+    parts = []
+    if method == METHOD_CODES['Remote']:
+        action = message['Action']
+        code = ACTION_CODES.get(action)
+        if code is None:
+            parts.append(_BYTE.pack(0) + _pack_string(action))
+        else:
+            parts.append(_BYTE.pack(code))
+        if 'Repeat' in message:
+            flags |= FLAG_REPEAT
+            parts.append(_REPEAT.pack(message['Repeat']))
+    else:
+        parts.append(_pack_string(message['ChannelNumber']))
+    if 'Sent' in message:
+        flags |= FLAG_SENT
+        parts.append(_SENT.pack(int(round(message['Sent'] * 1000))))
+    return _HEADER.pack(MAGIC, VERSION, method, flags) + b''.join(parts)
+
+
+def decode_binary(payload):
+    try:
+        magic, version, method, flags = _HEADER.unpack_from(payload, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a binary command')
+        if version != VERSION:
+            raise ValueError('Unsupported binary command version {}'.format(version))
+        offset = _HEADER.size
+        if method == METHOD_CODES['Remote']:
+            code = _BYTE.unpack_from(payload, offset)[0]
+            offset += 1
+            if code:
+                action = ACTIONS[code - 1]
+            else:
+                action, offset = _unpack_string(payload, offset)
+            message = {'Method': 'Remote', 'Action': action}
+            if flags & FLAG_REPEAT:
+                message['Repeat'] = _REPEAT.unpack_from(payload, offset)[0]
+                offset += _REPEAT.size
+        elif method == METHOD_CODES['Turn']:
+            channel, offset = _unpack_string(payload, offset)
+            message = {'Method': 'Turn', 'ChannelNumber': channel}
+        else:
+            raise ValueError('Unknown method code {}'.format(method))
+        if flags & FLAG_SENT:
+            message['Sent'] = _SENT.unpack_from(payload, offset)[0] / 1000.0
+    except (struct.error, IndexError) as e:
+        raise ValueError('Malformed binary command: {}'.format(e))
+    return message
+
+
+def encode(message, content_type=CONTENT_TYPE_JSON):
+    if content_type == CONTENT_TYPE_BINARY:
+        try:
+            return encode_binary(message)
+        except (ValueError, struct.error):
+            pass
+    return json.dumps(message)
+
+
+def decode(payload):
+    """
+    The command dict of a payload in either format; raises ValueError when it is neither.
+    """
+    if isinstance(payload, bytearray):
+        payload = bytes(payload)
+    if payload[:1] == _BYTE.pack(MAGIC):
+        return decode_binary(payload)
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    return json.loads(payload)